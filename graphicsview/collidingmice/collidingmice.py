@@ -44,8 +44,11 @@
 
 import math
 
-from PyQt5.QtCore import (qAbs, QLineF, QPointF, QRectF, qrand, qsrand, Qt,
-        QTime, QTimer)
+import numpy
+
+from PyQt5.QtCore import (qAbs, QCommandLineOption, QCommandLineParser,
+        QElapsedTimer, QLineF, QPointF, QRectF, qrand, qsrand, Qt, QTime,
+        QTimer)
 from PyQt5.QtGui import (QBrush, QColor, QPainter, QPainterPath, QPixmap,
         QPolygonF)
 from PyQt5.QtWidgets import (QApplication, QGraphicsItem, QGraphicsScene,
@@ -62,7 +65,7 @@ class Mouse(QGraphicsItem):
     adjust = 0.5
     BoundingRect = QRectF(-20 - adjust, -22 - adjust, 40 + adjust, 83 + adjust)
 
-    def __init__(self):
+    def __init__(self, ownTimer=True):
         super(Mouse, self).__init__()
 
         self.angle = 0.0
@@ -70,15 +73,22 @@ class Mouse(QGraphicsItem):
         self.mouseEyeDirection = 0.0
         self.color = QColor(qrand() % 256, qrand() % 256, qrand() % 256)
 
+        # Whether the mouse touches another one, when a MouseSimulation
+        # keeps track of it.
+        self.colliding = None
+
         self.setRotation(qrand() % (360 * 16))
 
         # In the C++ version of this example, this class is also derived from
         # QObject in order to receive timer events.  PyQt does not support
         # deriving from more than one wrapped class so we just create an
-        # explicit timer instead.
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.timerEvent)
-        self.timer.start(1000 / 33)
+        # explicit timer instead.  Mice moved by a MouseSimulation don't need
+        # one.
+        self.timer = None
+        if ownTimer:
+            self.timer = QTimer()
+            self.timer.timeout.connect(self.timerEvent)
+            self.timer.start(1000 // 33)
 
     @staticmethod
     def normalizeAngle(angle):
@@ -115,7 +125,10 @@ class Mouse(QGraphicsItem):
         painter.drawEllipse(QRectF(4.0 + self.mouseEyeDirection, -17, 4, 4))
 
         # Ears.
-        if self.scene().collidingItems(self):
+        colliding = self.colliding
+        if colliding is None:
+            colliding = self.scene().collidingItems(self)
+        if colliding:
             painter.setBrush(Qt.red)
         else:
             painter.setBrush(Qt.darkYellow)
@@ -189,6 +202,273 @@ class Mouse(QGraphicsItem):
         self.setPos(self.mapToParent(0, -(3 + math.sin(self.speed) * 3)))
 
 
+def bearing(dx, dy):
+    # The direction of (dx, dy) as Mouse.timerEvent() measures it, clockwise
+    # from straight ahead.
+    angle = numpy.arctan2(dy, dx) % Mouse.TwoPi
+    return (Mouse.Pi * 1.5 - angle) % Mouse.TwoPi
+
+
+def overlapsShape(polygon, normals, centers, us, vs):
+    """Return which mice have a shape that overlaps a convex polygon.
+
+    The polygon's vertices and the normals of its edges are in the frame of
+    the looking mouse, and each other mouse is given by the position of its
+    origin and the directions of its x and y axes in that frame.
+    """
+    halfWidth, halfHeight = 10.0, 20.0
+    separated = numpy.zeros(len(centers), bool)
+
+    # The edges of the polygon.
+    projections = polygon.dot(normals.T)
+    polygonMin = projections.min(axis=0)
+    polygonMax = projections.max(axis=0)
+    centerProjections = centers.dot(normals.T)
+    extents = (halfWidth * numpy.abs(us.dot(normals.T)) +
+            halfHeight * numpy.abs(vs.dot(normals.T)))
+    separated |= ((centerProjections + extents < polygonMin) |
+            (centerProjections - extents > polygonMax)).any(axis=1)
+
+    # The edges of the other mice's shapes.
+    for axes, extent in ((us, halfWidth), (vs, halfHeight)):
+        projections = polygon.dot(axes.T)
+        centerProjections = (centers * axes).sum(axis=1)
+        separated |= ((centerProjections + extent < projections.min(axis=0)) |
+                (centerProjections - extent > projections.max(axis=0)))
+
+    return ~separated
+
+
+class MouseSimulation(object):
+    """Steers all the mice of a scene at once.
+
+    The positions, rotations, angles and speeds of the mice are kept in
+    arrays, and the mice near each one are found from a grid of cells
+    rebuilt once per tick, so that a tick is a few array operations.  The
+    items are only moved by apply(), which can show them part of the way
+    between the last two ticks.
+    """
+
+    # The triangle a mouse looks ahead through for other mice, and the
+    # normals of its edges.
+    SightTriangle = numpy.array([(0.0, 0.0), (-30.0, -50.0), (30.0, -50.0)])
+    SightNormals = numpy.array([(50.0, -30.0), (0.0, 1.0), (50.0, 30.0)])
+
+    # The shape of a mouse, and the normals of its edges.
+    ShapeCorners = numpy.array([(-10.0, -20.0), (10.0, -20.0), (10.0, 20.0),
+            (-10.0, 20.0)])
+    ShapeNormals = numpy.array([(1.0, 0.0), (0.0, 1.0)])
+
+    # Mice further apart than this can't see each other, the sight triangle
+    # reaching 58.3 from a mouse's origin and its shape 22.4.
+    SightRange = 81.0
+    TouchRange = 45.0
+
+    def __init__(self, mice, homeRadius=150.0):
+        self.mice = mice
+        self.homeRadius = homeRadius
+
+        self.x = numpy.array([mouse.x() for mouse in mice], float)
+        self.y = numpy.array([mouse.y() for mouse in mice], float)
+        self.rotation = numpy.array([mouse.rotation() for mouse in mice],
+                float)
+        self.angle = numpy.array([mouse.angle for mouse in mice], float)
+        self.speed = numpy.array([mouse.speed for mouse in mice], float)
+        self.eyeDirection = numpy.zeros(len(mice))
+        self.colliding = numpy.zeros(len(mice), bool)
+
+        self.previousX = self.x
+        self.previousY = self.y
+        self.previousRotation = self.rotation
+
+        # Each mouse is painted into a pixmap that is only redrawn when its
+        # eyes or ears change, not whenever it moves or turns.
+        self.shownEyeDirection = numpy.zeros(len(mice))
+        self.shownColliding = numpy.zeros(len(mice), bool)
+        for mouse in mice:
+            mouse.colliding = False
+            mouse.setCacheMode(QGraphicsItem.ItemCoordinateCache)
+
+    def neighbours(self):
+        """Return the pairs of different mice in the same or adjacent cells.
+
+        Each pair appears once for either order of the mice.
+        """
+        count = len(self.mice)
+        cellX = numpy.floor(self.x / self.SightRange).astype(numpy.int64)
+        cellY = numpy.floor(self.y / self.SightRange).astype(numpy.int64)
+        cellX -= cellX.min() - 1
+        cellY -= cellY.min() - 1
+        stride = cellY.max() + 2
+        keys = cellX * stride + cellY
+
+        # The mice sorted by cell, and where each cell's run of them starts.
+        order = numpy.argsort(keys, kind='stable')
+        cellCounts = numpy.bincount(keys, minlength=(cellX.max() + 2) * stride)
+        cellStarts = numpy.cumsum(cellCounts) - cellCounts
+        firsts = []
+        counts = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cells = keys + dx * stride + dy
+                firsts.append(cellStarts[cells])
+                counts.append(cellCounts[cells])
+        firsts = numpy.concatenate(firsts)
+        counts = numpy.concatenate(counts)
+
+        owners = numpy.tile(numpy.arange(count), 9)
+        total = counts.sum()
+        ends = numpy.cumsum(counts)
+        within = numpy.arange(total) - numpy.repeat(ends - counts, counts)
+        i = numpy.repeat(owners, counts)
+        j = order[numpy.repeat(firsts, counts) + within]
+        different = i != j
+        return i[different], j[different]
+
+    def step(self):
+        self.previousX = self.x
+        self.previousY = self.y
+        self.previousRotation = self.rotation
+
+        count = len(self.mice)
+        x, y = self.x, self.y
+        radians = numpy.radians(self.rotation)
+        cos, sin = numpy.cos(radians), numpy.sin(radians)
+        angle = self.angle
+        pi = Mouse.Pi
+
+        # Don't move too far away.
+        toCenterX = -x * cos - y * sin
+        toCenterY = x * sin - y * cos
+        far = numpy.hypot(toCenterX, toCenterY) > self.homeRadius
+        angleToCenter = bearing(toCenterX, toCenterY)
+        left = far & (angleToCenter > pi / 4) & (angleToCenter < pi)
+        right = far & (angleToCenter >= pi) & (angleToCenter < pi * 1.75)
+        sinAngle = numpy.sin(angle)
+        turn = numpy.where(sinAngle < 0, 0.25,
+                numpy.where(sinAngle > 0, -0.25, 0.0))
+        turn[far] = 0.0
+        turn[left] = numpy.where(angle[left] < -pi / 2, 0.25, -0.25)
+        turn[right] = numpy.where(angle[right] < pi / 2, 0.25, -0.25)
+        angle = angle + turn
+
+        # Try not to crash with any other mice.
+        i, j = self.neighbours()
+        dx = x[j] - x[i]
+        dy = y[j] - y[i]
+        near = numpy.hypot(dx, dy) < self.SightRange
+        i, j, dx, dy = i[near], j[near], dx[near], dy[near]
+        centers = numpy.stack([dx * cos[i] + dy * sin[i],
+                dy * cos[i] - dx * sin[i]], axis=1)
+        relative = radians[j] - radians[i]
+        us = numpy.stack([numpy.cos(relative), numpy.sin(relative)], axis=1)
+        vs = numpy.stack([-us[:, 1], us[:, 0]], axis=1)
+
+        seen = overlapsShape(self.SightTriangle, self.SightNormals, centers,
+                us, vs)
+        angleToMouse = bearing(centers[seen, 0], centers[seen, 1])
+        turns = numpy.where(angleToMouse < pi / 2, 0.5,
+                numpy.where(angleToMouse > pi * 1.5, -0.5, 0.0))
+        angle += numpy.bincount(i[seen], turns, count)
+
+        close = numpy.hypot(centers[:, 0], centers[:, 1]) < self.TouchRange
+        touching = overlapsShape(self.ShapeCorners, self.ShapeNormals,
+                centers[close], us[close], vs[close])
+        self.colliding = numpy.bincount(i[close][touching], minlength=count) > 0
+
+        # Add some random movement.
+        dangerous = numpy.bincount(i[seen], minlength=count) > 0
+        wander = dangerous & (numpy.random.randint(0, 10, count) == 0)
+        angle -= numpy.where(wander,
+                numpy.random.randint(0, 100, count) / 500.0, 0.0)
+
+        self.speed += (-50 + numpy.random.randint(0, 100, count)) / 100.0
+
+        dx = numpy.sin(angle) * 10
+        self.eyeDirection = numpy.where(numpy.abs(dx / 5) < 1, 0.0, dx / 5)
+        self.angle = angle
+
+        self.rotation = self.rotation + dx
+        radians = numpy.radians(self.rotation)
+        distance = 3 + numpy.sin(self.speed) * 3
+        self.x = x + distance * numpy.sin(radians)
+        self.y = y - distance * numpy.cos(radians)
+
+    def apply(self, progress=1.0):
+        """Move the items to the given fraction of the way from where the
+        mice were before the last tick to where they are now."""
+        x = self.previousX + (self.x - self.previousX) * progress
+        y = self.previousY + (self.y - self.previousY) * progress
+        rotation = self.previousRotation + \
+                (self.rotation - self.previousRotation) * progress
+
+        # Half a pixel is as finely as the eyes are worth repainting for.
+        eyeDirection = numpy.round(self.eyeDirection * 2) / 2
+        changed = ((eyeDirection != self.shownEyeDirection) |
+                (self.colliding != self.shownColliding))
+        self.shownEyeDirection = eyeDirection
+        self.shownColliding = self.colliding
+
+        for i in numpy.flatnonzero(changed).tolist():
+            mouse = self.mice[i]
+            mouse.mouseEyeDirection = float(eyeDirection[i])
+            mouse.colliding = bool(self.colliding[i])
+            mouse.update()
+
+        for mouse, x, y, rotation in zip(self.mice, x.tolist(), y.tolist(),
+                rotation.tolist()):
+            mouse.setRotation(rotation)
+            mouse.setPos(x, y)
+
+
+class SimulationClock(object):
+    """Advances a MouseSimulation in fixed steps on a single timer.
+
+    The scene is redrawn at up to FrameRate frames a second whatever the
+    length of a step, the mice being shown between their last two steps.
+    When drawing falls behind, several steps are taken before the next frame
+    and the frames in between are skipped, and when even that can't keep up
+    the simulation slows down rather than trying to catch up forever.
+    """
+
+    StepInterval = 1000.0 / 33
+    FrameRate = 60
+    MaxStepsPerFrame = 5
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.lag = 0.0
+        self.frames = 0
+        self.steps = 0
+        self.droppedSteps = 0
+
+        self.elapsed = QElapsedTimer()
+        self.elapsed.start()
+
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(1000 // self.FrameRate)
+
+    def tick(self):
+        self.lag += self.elapsed.restart()
+
+        steps = 0
+        while self.lag >= self.StepInterval:
+            if steps == self.MaxStepsPerFrame:
+                dropped = int(self.lag // self.StepInterval)
+                self.droppedSteps += dropped
+                self.lag -= dropped * self.StepInterval
+                break
+            self.simulation.step()
+            self.lag -= self.StepInterval
+            steps += 1
+
+        self.steps += steps
+        self.frames += 1
+        self.simulation.apply(self.lag / self.StepInterval)
+
+
 if __name__ == '__main__':
 
     import sys
@@ -198,15 +478,48 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     qsrand(QTime(0,0,0).secsTo(QTime.currentTime()))
 
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Colliding Mice Example")
+    parser.addHelpOption()
+    countOption = QCommandLineOption(['n', 'mice'],
+            "Release <count> mice.", 'count', str(MouseCount))
+    parser.addOption(countOption)
+    batchOption = QCommandLineOption(['b', 'batch'],
+            "Steer all the mice at once rather than each on its own timer.")
+    parser.addOption(batchOption)
+    parser.process(app)
+
+    try:
+        mouseCount = max(1, int(parser.value(countOption)))
+    except ValueError:
+        parser.showHelp(1)
+    batch = parser.isSet(batchOption)
+
+    # Give a crowd of mice as much room each as the default few have.
+    spread = math.sqrt(max(1.0, mouseCount / float(MouseCount)))
+
     scene = QGraphicsScene()
-    scene.setSceneRect(-300, -300, 600, 600)
+    scene.setSceneRect(-300 * spread, -300 * spread, 600 * spread,
+            600 * spread)
     scene.setItemIndexMethod(QGraphicsScene.NoIndex)
 
-    for i in range(MouseCount):
-        mouse = Mouse()
-        mouse.setPos(math.sin((i * 6.28) / MouseCount) * 200,
-                     math.cos((i * 6.28) / MouseCount) * 200)
+    mice = []
+    for i in range(mouseCount):
+        mouse = Mouse(ownTimer=not batch)
+        if mouseCount <= MouseCount:
+            mouse.setPos(math.sin((i * 6.28) / mouseCount) * 200,
+                         math.cos((i * 6.28) / mouseCount) * 200)
+        else:
+            # Spread a crowd evenly over a disc rather than around a circle.
+            radius = math.sqrt((i + 0.5) / mouseCount) * 200 * spread
+            mouse.setPos(math.sin(i * 2.39996) * radius,
+                         math.cos(i * 2.39996) * radius)
         scene.addItem(mouse)
+        mice.append(mouse)
+
+    if batch:
+        clock = SimulationClock(MouseSimulation(mice,
+                homeRadius=150 * spread))
 
     view = QGraphicsView(scene)
     view.setRenderHint(QPainter.Antialiasing)
@@ -43,15 +43,280 @@
 
 
 import math
+from xml.etree import ElementTree
 
-from PyQt5.QtCore import (qAbs, QLineF, QPointF, qrand, QRectF, QSizeF, qsrand,
-        Qt, QTime)
+import numpy
+
+from PyQt5.QtCore import (QCommandLineOption, QCommandLineParser, QLineF,
+        QPointF, qrand, QRectF, QSizeF, qsrand, Qt, QTime)
 from PyQt5.QtGui import (QBrush, QColor, QLinearGradient, QPainter,
         QPainterPath, QPen, QPolygonF, QRadialGradient)
 from PyQt5.QtWidgets import (QApplication, QGraphicsItem, QGraphicsScene,
         QGraphicsView, QStyle)
 
 
+# Graphs with up to this many nodes have their repulsion summed over every
+# pair of nodes, larger ones use the grid below.
+ExactRepulsionLimit = 150
+
+MaxGridDepth = 10
+
+# The simulation stops once no node moves further than this in a tick.
+SettledDistance = 0.2
+
+# The cells of a level of the grid whose parents are neighbours of a cell's
+# parent, but which are not neighbours of the cell itself, for each of the
+# four positions a cell can have within its parent.
+FarOffsets = [[(dx, dy) for dx in range(-2 - px, 4 - px)
+                for dy in range(-2 - py, 4 - py)
+                if abs(dx) > 1 or abs(dy) > 1]
+        for px in (0, 1) for py in (0, 1)]
+
+NearOffsets = [(dx, dy) for dx in range(-1, 2) for dy in range(-1, 2)]
+
+# The side of the square of scene given to each node of a generated or
+# imported graph, which keeps most of them clear of the scene's edges.
+NodeSpacing = 150
+
+# The example's own graph, a 3x3 grid of nodes.
+DemoPositions = [(-50, -50), (0, -50), (50, -50), (-50, 0), (0, 0), (50, 0),
+        (-50, 50), (0, 50), (50, 50)]
+
+DemoEdges = [(0, 1), (1, 2), (1, 4), (2, 5), (3, 0), (3, 4), (4, 5), (4, 7),
+        (5, 8), (6, 3), (7, 6), (8, 7)]
+
+
+def readEdgeList(path):
+    """Read a graph from a text file with a "source dest" pair per line.
+
+    Nodes may be named by any word.  Lines starting with '#' or '%' are
+    comments, a line with a single word adds a node without edges and any
+    words after the first two, such as weights, are ignored.  Returns the
+    number of nodes and a list of (source, dest) node indices.
+    """
+    index = {}
+    edges = []
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if not words or words[0][0] in '#%':
+                continue
+            ends = [index.setdefault(word, len(index)) for word in words[:2]]
+            if len(ends) == 2:
+                edges.append(tuple(ends))
+    return len(index), edges
+
+
+def readGraphML(path):
+    """Read the nodes and edges of the first graph of a GraphML file.
+
+    Returns the number of nodes and a list of (source, dest) node indices.
+    """
+    index = {}
+    edges = []
+    for _, element in ElementTree.iterparse(path):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'node':
+            index.setdefault(element.get('id'), len(index))
+        elif tag == 'edge':
+            edges.append((index.setdefault(element.get('source'), len(index)),
+                    index.setdefault(element.get('target'), len(index))))
+        elif tag == 'graph':
+            break
+        else:
+            continue
+        element.clear()
+    return len(index), edges
+
+
+def readGraph(path):
+    if path.lower().endswith(('.graphml', '.xml')):
+        return readGraphML(path)
+    return readEdgeList(path)
+
+
+def randomGraph(nodeCount, edgeCount, seed=None):
+    """Return a list of edgeCount random edges between nodeCount nodes.
+
+    Edges never join a node to itself, but two nodes may be joined more than
+    once.
+    """
+    if nodeCount < 2:
+        return []
+    random = numpy.random.RandomState(seed)
+    sources = random.randint(0, nodeCount, edgeCount)
+    dests = (sources + random.randint(1, nodeCount, edgeCount)) % nodeCount
+    return list(zip(sources.tolist(), dests.tolist()))
+
+
+def exactRepulsion(positions):
+    # Each node pushes another away by 150 / (2 * distance).
+    delta = positions[:, numpy.newaxis, :] - positions[numpy.newaxis, :, :]
+    l = 2.0 * (delta * delta).sum(axis=2)
+    l[l == 0] = numpy.inf
+    return (delta * (150.0 / l)[:, :, numpy.newaxis]).sum(axis=1)
+
+
+def gridRepulsion(positions):
+    """Approximate the repulsion between all nodes in O(n log n).
+
+    Like a Barnes-Hut quadtree, the nodes are put in a hierarchy of grids.
+    At every level, a node is pushed by the centre of mass of each cell
+    that is too far away to have been counted at the level below, and the
+    nodes in the neighbouring cells of the finest level push it directly.
+    Every grid has a border of empty cells, so that no offset needs to be
+    checked against its bounds.
+    """
+    count = len(positions)
+    depth = int(math.ceil(math.log(max(count / 2.0, 4), 4)))
+    depth = min(depth, MaxGridDepth)
+    x = positions[:, 0]
+    y = positions[:, 1]
+    origin = positions.min(axis=0)
+    size = (positions.max(axis=0) - origin).max() or 1.0
+    side = 1 << depth
+    cx = numpy.minimum((x - origin[0]) * (side / size), side - 1).astype(int)
+    cy = numpy.minimum((y - origin[1]) * (side / size), side - 1).astype(int)
+    fx = numpy.zeros(count)
+    fy = numpy.zeros(count)
+
+    for level in range(2, depth + 1):
+        padded = (1 << level) + 6
+        lx = cx >> (depth - level)
+        ly = cy >> (depth - level)
+        ids = (lx + 3) * padded + ly + 3
+        mass = numpy.bincount(ids, minlength=padded * padded)
+        mx = numpy.bincount(ids, x, padded * padded) / numpy.maximum(mass, 1)
+        my = numpy.bincount(ids, y, padded * padded) / numpy.maximum(mass, 1)
+        parity = (lx & 1) * 2 + (ly & 1)
+        for offsets, members in zip(FarOffsets,
+                (numpy.flatnonzero(parity == p) for p in range(4))):
+            offsets = numpy.array([dx * padded + dy for dx, dy in offsets])
+            others = ids[members, numpy.newaxis] + offsets
+            dx = x[members, numpy.newaxis] - mx[others]
+            dy = y[members, numpy.newaxis] - my[others]
+            scale = 75.0 * mass[others] / numpy.maximum(dx * dx + dy * dy, 1e-9)
+            fx[members] += (dx * scale).sum(axis=1)
+            fy[members] += (dy * scale).sum(axis=1)
+
+    padded = side + 2
+    ids = (cx + 1) * padded + cy + 1
+    order = numpy.argsort(ids, kind='stable')
+    counts = numpy.bincount(ids, minlength=padded * padded)
+    starts = numpy.cumsum(counts) - counts
+    for dx, dy in NearOffsets:
+        others = ids + dx * padded + dy
+        otherCounts = counts[others]
+        otherStarts = starts[others]
+        i = numpy.flatnonzero(otherCounts)
+        for k in range(otherCounts.max()):
+            i = i[otherCounts[i] > k]
+            j = order[otherStarts[i] + k]
+            ddx = x[i] - x[j]
+            ddy = y[i] - y[j]
+            l = ddx * ddx + ddy * ddy
+            l[l == 0] = numpy.inf
+            fx[i] += ddx * 75.0 / l
+            fy[i] += ddy * 75.0 / l
+    return numpy.stack([fx, fy], axis=1)
+
+
+class ForceLayout(object):
+    """Runs the simulation of all the nodes of a graph at once.
+
+    The positions of the nodes are kept as an array with a row per node,
+    and the edges as arrays of node indices, so that a whole tick is a few
+    array operations.
+    """
+
+    def __init__(self):
+        self.nodes = None
+        self.index = {}
+        self.edges = []
+        self.positions = numpy.zeros((0, 2))
+        self.sources = numpy.zeros(0, numpy.int64)
+        self.dests = numpy.zeros(0, numpy.int64)
+        self.weights = numpy.ones(0)
+
+    def setNodes(self, nodes):
+        self.nodes = nodes
+        self.index = index = dict((node, i) for i, node in enumerate(nodes))
+        self.edges = []
+        sources = []
+        dests = []
+        for i, node in enumerate(nodes):
+            for edge in node.edges():
+                if edge.sourceNode() is node and edge.destNode() in index:
+                    self.edges.append(edge)
+                    sources.append(i)
+                    dests.append(index[edge.destNode()])
+        self.positions = numpy.array([(pos.x(), pos.y())
+                for pos in (node.pos() for node in nodes)]).reshape(-1, 2)
+        self.sources = numpy.array(sources, numpy.int64)
+        self.dests = numpy.array(dests, numpy.int64)
+        self.weights = numpy.array([(len(node.edges()) + 1) * 10.0
+                for node in nodes])
+
+    def nodeMoved(self, node):
+        i = self.index.get(node)
+        if i is not None:
+            self.positions[i] = (node.x(), node.y())
+
+    def velocities(self, positions):
+        count = len(positions)
+        if count <= ExactRepulsionLimit:
+            velocities = exactRepulsion(positions)
+        else:
+            velocities = gridRepulsion(positions)
+
+        # Now add all forces pulling items together.
+        delta = positions[self.dests] - positions[self.sources]
+        for axis in (0, 1):
+            velocities[:, axis] += (
+                    numpy.bincount(self.sources, delta[:, axis], count) -
+                    numpy.bincount(self.dests, delta[:, axis], count)) / \
+                    self.weights
+
+        velocities[(numpy.abs(velocities) < 0.1).all(axis=1)] = 0.0
+        return velocities
+
+    def step(self, sceneRect, pinned=None):
+        """Advance every node by one tick.
+
+        Returns the indices of the nodes that moved and the largest
+        distance any of them moved.
+        """
+        positions = self.positions
+        velocities = self.velocities(positions)
+        if pinned is not None:
+            velocities[pinned] = 0.0
+
+        newPositions = positions + velocities
+        newPositions[:, 0].clip(sceneRect.left() + 10, sceneRect.right() - 10,
+                out=newPositions[:, 0])
+        newPositions[:, 1].clip(sceneRect.top() + 10, sceneRect.bottom() - 10,
+                out=newPositions[:, 1])
+
+        steps = numpy.abs(newPositions - positions)
+        moved = numpy.flatnonzero(steps.any(axis=1))
+        self.positions = newPositions
+        return moved, steps.max() if len(moved) else 0.0
+
+    def edgeLines(self, moved):
+        """Return the edges touching the given nodes and their new ends."""
+        touched = numpy.zeros(len(self.positions), bool)
+        touched[moved] = True
+        edges = numpy.flatnonzero(touched[self.sources] | touched[self.dests])
+        p1 = self.positions[self.sources[edges]]
+        p2 = self.positions[self.dests[edges]]
+        delta = p2 - p1
+        length = numpy.hypot(delta[:, 0], delta[:, 1])[:, numpy.newaxis]
+        long = length > 20.0
+        offset = numpy.where(long, delta * 10 / numpy.where(long, length, 1),
+                0.0)
+        return (edges, p1 + offset, numpy.where(long, p2 - offset, p1))
+
+
 class Edge(QGraphicsItem):
     Pi = math.pi
     TwoPi = 2.0 * Pi
@@ -97,17 +362,19 @@ class Edge(QGraphicsItem):
                 self.mapFromItem(self.dest, 0, 0))
         length = line.length()
 
-        self.prepareGeometryChange()
-
         if length > 20.0:
             edgeOffset = QPointF((line.dx() * 10) / length,
                     (line.dy() * 10) / length)
 
-            self.sourcePoint = line.p1() + edgeOffset
-            self.destPoint = line.p2() - edgeOffset
+            self.setPoints(line.p1() + edgeOffset, line.p2() - edgeOffset)
         else:
-            self.sourcePoint = line.p1()
-            self.destPoint = line.p1()
+            self.setPoints(line.p1(), line.p1())
+
+    def setPoints(self, sourcePoint, destPoint):
+        self.prepareGeometryChange()
+
+        self.sourcePoint = sourcePoint
+        self.destPoint = destPoint
 
     def boundingRect(self):
         if not self.source or not self.dest:
@@ -161,7 +428,6 @@ class Node(QGraphicsItem):
 
         self.graph = graphWidget
         self.edgeList = []
-        self.newPos = QPointF()
 
         self.setFlag(QGraphicsItem.ItemIsMovable)
         self.setFlag(QGraphicsItem.ItemSendsGeometryChanges)
@@ -174,55 +440,11 @@ class Node(QGraphicsItem):
     def addEdge(self, edge):
         self.edgeList.append(edge)
         edge.adjust()
+        self.graph.graphChanged()
 
     def edges(self):
         return self.edgeList
 
-    def calculateForces(self):
-        if not self.scene() or self.scene().mouseGrabberItem() is self:
-            self.newPos = self.pos()
-            return
-    
-        # Sum up all forces pushing this item away.
-        xvel = 0.0
-        yvel = 0.0
-        for item in self.scene().items():
-            if not isinstance(item, Node):
-                continue
-
-            line = QLineF(self.mapFromItem(item, 0, 0), QPointF(0, 0))
-            dx = line.dx()
-            dy = line.dy()
-            l = 2.0 * (dx * dx + dy * dy)
-            if l > 0:
-                xvel += (dx * 150.0) / l
-                yvel += (dy * 150.0) / l
-
-        # Now subtract all forces pulling items together.
-        weight = (len(self.edgeList) + 1) * 10.0
-        for edge in self.edgeList:
-            if edge.sourceNode() is self:
-                pos = self.mapFromItem(edge.destNode(), 0, 0)
-            else:
-                pos = self.mapFromItem(edge.sourceNode(), 0, 0)
-            xvel += pos.x() / weight
-            yvel += pos.y() / weight
-    
-        if qAbs(xvel) < 0.1 and qAbs(yvel) < 0.1:
-            xvel = yvel = 0.0
-
-        sceneRect = self.scene().sceneRect()
-        self.newPos = self.pos() + QPointF(xvel, yvel)
-        self.newPos.setX(min(max(self.newPos.x(), sceneRect.left() + 10), sceneRect.right() - 10))
-        self.newPos.setY(min(max(self.newPos.y(), sceneRect.top() + 10), sceneRect.bottom() - 10))
-
-    def advance(self):
-        if self.newPos == self.pos():
-            return False
-
-        self.setPos(self.newPos)
-        return True
-
     def boundingRect(self):
         adjust = 2.0
         return QRectF(-10 - adjust, -10 - adjust, 23 + adjust, 23 + adjust)
@@ -253,9 +475,13 @@ class Node(QGraphicsItem):
 
     def itemChange(self, change, value):
         if change == QGraphicsItem.ItemPositionHasChanged:
-            for edge in self.edgeList:
-                edge.adjust()
-            self.graph.itemMoved()
+            # The graph refreshes the edges itself after a tick.
+            if not self.graph.applyingLayout:
+                for edge in self.edgeList:
+                    edge.adjust()
+                self.graph.itemMoved(self)
+        elif change == QGraphicsItem.ItemSceneHasChanged:
+            self.graph.graphChanged()
 
         return super(Node, self).itemChange(change, value)
 
@@ -273,6 +499,8 @@ class GraphWidget(QGraphicsView):
         super(GraphWidget, self).__init__()
 
         self.timerId = 0
+        self.layout = ForceLayout()
+        self.applyingLayout = False
 
         scene = QGraphicsScene(self)
         scene.setItemIndexMethod(QGraphicsScene.NoIndex)
@@ -284,92 +512,123 @@ class GraphWidget(QGraphicsView):
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
 
-        node1 = Node(self)
-        node2 = Node(self)
-        node3 = Node(self)
-        node4 = Node(self)
-        self.centerNode = Node(self)
-        node6 = Node(self)
-        node7 = Node(self)
-        node8 = Node(self)
-        node9 = Node(self)
-        scene.addItem(node1)
-        scene.addItem(node2)
-        scene.addItem(node3)
-        scene.addItem(node4)
-        scene.addItem(self.centerNode)
-        scene.addItem(node6)
-        scene.addItem(node7)
-        scene.addItem(node8)
-        scene.addItem(node9)
-        scene.addItem(Edge(node1, node2))
-        scene.addItem(Edge(node2, node3))
-        scene.addItem(Edge(node2, self.centerNode))
-        scene.addItem(Edge(node3, node6))
-        scene.addItem(Edge(node4, node1))
-        scene.addItem(Edge(node4, self.centerNode))
-        scene.addItem(Edge(self.centerNode, node6))
-        scene.addItem(Edge(self.centerNode, node8))
-        scene.addItem(Edge(node6, node9))
-        scene.addItem(Edge(node7, node4))
-        scene.addItem(Edge(node8, node7))
-        scene.addItem(Edge(node9, node8))
-
-        node1.setPos(-50, -50)
-        node2.setPos(0, -50)
-        node3.setPos(50, -50)
-        node4.setPos(-50, 0)
-        self.centerNode.setPos(0, 0)
-        node6.setPos(50, 0)
-        node7.setPos(-50, 50)
-        node8.setPos(0, 50)
-        node9.setPos(50, 50)
+        self.centerNode = None
+        self.setGraph(9, DemoEdges, DemoPositions, center=4)
 
         self.scale(0.8, 0.8)
         self.setMinimumSize(400, 400)
         self.setWindowTitle("Elastic Nodes")
 
-    def itemMoved(self):
+    def setGraph(self, nodeCount, edges, positions=None, center=0):
+        """Replace the scene's items with a graph of nodeCount nodes.
+
+        edges is a sequence of (source, dest) node indices.  Without
+        positions the nodes are scattered at random over a scene that grows
+        with the number of nodes.
+        """
+        if self.timerId:
+            self.killTimer(self.timerId)
+            self.timerId = 0
+
+        scene = self.scene()
+        scene.clear()
+        self.layout = ForceLayout()
+        self.centerNode = None
+
+        if positions is None:
+            side = max(400.0, NodeSpacing * math.sqrt(nodeCount))
+            scene.setSceneRect(-side / 2, -side / 2, side, side)
+            positions = numpy.random.uniform(-side / 2 + 10, side / 2 - 10,
+                    (nodeCount, 2)).tolist()
+
+        nodes = [Node(self) for _ in range(nodeCount)]
+        self.applyingLayout = True
+        try:
+            for node, (x, y) in zip(nodes, positions):
+                node.setPos(x, y)
+                scene.addItem(node)
+        finally:
+            self.applyingLayout = False
+
+        for source, dest in edges:
+            scene.addItem(Edge(nodes[source], nodes[dest]))
+
+        if nodes:
+            self.centerNode = nodes[center]
+            self.itemMoved(self.centerNode)
+
+    def graphChanged(self):
+        self.layout.nodes = None
+
+    def itemMoved(self, node):
+        self.layout.nodeMoved(node)
         if not self.timerId:
-            self.timerId = self.startTimer(1000 / 25)
+            self.timerId = self.startTimer(1000 // 25)
 
     def keyPressEvent(self, event):
         key = event.key()
 
         if key == Qt.Key_Up:
-            self.centerNode.moveBy(0, -20)
+            self.moveCenterNode(0, -20)
         elif key == Qt.Key_Down:
-            self.centerNode.moveBy(0, 20)
+            self.moveCenterNode(0, 20)
         elif key == Qt.Key_Left:
-            self.centerNode.moveBy(-20, 0)
+            self.moveCenterNode(-20, 0)
         elif key == Qt.Key_Right:
-            self.centerNode.moveBy(20, 0)
+            self.moveCenterNode(20, 0)
         elif key == Qt.Key_Plus:
             self.scaleView(1.2)
         elif key == Qt.Key_Minus:
             self.scaleView(1 / 1.2)
         elif key == Qt.Key_Space or key == Qt.Key_Enter:
+            rect = self.scene().sceneRect().adjusted(50, 50, -50, -50)
+            width = max(1, int(rect.width()))
+            height = max(1, int(rect.height()))
             for item in self.scene().items():
                 if isinstance(item, Node):
-                    item.setPos(-150 + qrand() % 300, -150 + qrand() % 300)
+                    item.setPos(rect.left() + qrand() % width,
+                            rect.top() + qrand() % height)
         else:
             super(GraphWidget, self).keyPressEvent(event)
 
-    def timerEvent(self, event):
-        nodes = [item for item in self.scene().items() if isinstance(item, Node)]
-
-        for node in nodes:
-            node.calculateForces()
+    def moveCenterNode(self, dx, dy):
+        if self.centerNode is not None:
+            self.centerNode.moveBy(dx, dy)
 
-        itemsMoved = False
-        for node in nodes:
-            if node.advance():
-                itemsMoved = True
-
-        if not itemsMoved:
+    def timerEvent(self, event):
+        if self.advanceLayout() < SettledDistance:
             self.killTimer(self.timerId)
             self.timerId = 0
 
+    def advanceLayout(self):
+        """Run one tick and return the furthest distance a node moved."""
+        if self.layout.nodes is None:
+            self.layout.setNodes([item for item in self.scene().items()
+                    if isinstance(item, Node)])
+
+        grabber = self.layout.index.get(self.scene().mouseGrabberItem())
+        moved, distance = self.layout.step(self.scene().sceneRect(), grabber)
+        self.applyLayout(moved)
+        return distance
+
+    def applyLayout(self, moved):
+        # Move the nodes without each one adjusting its edges, then give
+        # every edge touching a moved node its new ends once.
+        nodes = self.layout.nodes
+        edges = self.layout.edges
+        self.applyingLayout = True
+        try:
+            for i, (x, y) in zip(moved.tolist(),
+                    self.layout.positions[moved].tolist()):
+                nodes[i].setPos(x, y)
+        finally:
+            self.applyingLayout = False
+
+        indices, sourcePoints, destPoints = self.layout.edgeLines(moved)
+        for i, (x1, y1), (x2, y2) in zip(indices.tolist(),
+                sourcePoints.tolist(), destPoints.tolist()):
+            edges[i].setPoints(QPointF(x1, y1), QPointF(x2, y2))
+
     def wheelEvent(self, event):
         self.scaleView(math.pow(2.0, -event.angleDelta().y() / 240.0))
 
@@ -424,7 +683,41 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     qsrand(QTime(0,0,0).secsTo(QTime.currentTime()))
 
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Elastic Nodes Example")
+    parser.addHelpOption()
+    parser.addPositionalArgument('file',
+            "An edge list or GraphML file to lay out.", '[file]')
+    nodesOption = QCommandLineOption(['n', 'nodes'],
+            "Lay out a random graph of <count> nodes.", 'count')
+    parser.addOption(nodesOption)
+    edgesOption = QCommandLineOption(['e', 'edges'],
+            "Give the random graph <count> edges, twice the number of nodes "
+            "by default.", 'count')
+    parser.addOption(edgesOption)
+    parser.process(app)
+
     widget = GraphWidget()
+
+    if parser.positionalArguments():
+        try:
+            nodeCount, edges = readGraph(parser.positionalArguments()[0])
+        except (EnvironmentError, ElementTree.ParseError) as e:
+            sys.stderr.write("Unable to read the graph: %s\n" % e)
+            sys.exit(1)
+        widget.setGraph(nodeCount, edges)
+    elif parser.isSet(nodesOption):
+        try:
+            nodeCount = int(parser.value(nodesOption))
+            edgeCount = int(parser.value(edgesOption) or 2 * nodeCount)
+        except ValueError:
+            nodeCount = edgeCount = -1
+        if nodeCount < 0 or edgeCount < 0:
+            sys.stderr.write("The node and edge counts must be whole numbers "
+                    "that aren't negative.\n")
+            parser.showHelp(1)
+        widget.setGraph(nodeCount, randomGraph(nodeCount, edgeCount))
+
     widget.show()
 
     sys.exit(app.exec_())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+# Lay out random graphs of increasing size with the Elastic Nodes example's
+# GraphWidget without showing it and write the timings as JSON.  Each size is
+# measured in a process of its own so that its memory use can be told apart.
+
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from PyQt5.QtCore import (QCommandLineOption, QCommandLineParser,
+        QCoreApplication)
+
+DefaultSizes = '100,1000,10000,50000'
+
+
+def residentMemory():
+    # The resident set size of this process in bytes, where it is known.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (EnvironmentError, ValueError):
+        return None
+
+
+def measure(nodeCount, edgeCount, seed, maxTicks, timeout):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    import numpy
+    from PyQt5.QtWidgets import QApplication
+    from elasticnodes import GraphWidget, randomGraph, SettledDistance
+
+    app = QApplication.instance() or QApplication([])
+    widget = GraphWidget()
+    widget.setGraph(0, [])
+    edges = randomGraph(nodeCount, edgeCount, seed)
+    numpy.random.seed(seed)
+    baseline = residentMemory()
+
+    start = time.perf_counter()
+    widget.setGraph(nodeCount, edges)
+    buildTime = time.perf_counter() - start
+
+    # The first tick also gathers the nodes and edges into the layout.
+    start = time.perf_counter()
+    distance = widget.advanceLayout()
+    firstTickTime = time.perf_counter() - start
+    memory = residentMemory()
+
+    ticks = 1
+    converged = bool(distance < SettledDistance)
+    start = time.perf_counter()
+    elapsed = 0.0
+    while not converged and ticks < maxTicks and elapsed < timeout:
+        distance = widget.advanceLayout()
+        ticks += 1
+        converged = bool(distance < SettledDistance)
+        elapsed = time.perf_counter() - start
+
+    if baseline is None or memory is None:
+        memoryPerNode = None
+    else:
+        memoryPerNode = (memory - baseline) / float(max(1, nodeCount))
+
+    return {
+        'nodes': nodeCount,
+        'edges': edgeCount,
+        'buildTime': buildTime,
+        'firstTickTime': firstTickTime,
+        'ticks': ticks,
+        'ticksPerSecond': (ticks - 1) / elapsed if elapsed > 0 else None,
+        'converged': converged,
+        'timeToConvergence': firstTickTime + elapsed if converged else None,
+        'lastDistance': float(distance),
+        'memoryPerNode': memoryPerNode,
+    }
+
+
+if __name__ == '__main__':
+
+    app = QCoreApplication(sys.argv)
+
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Elastic Nodes Example Benchmark")
+    parser.addHelpOption()
+    outputOption = QCommandLineOption(['o', 'output'],
+            "Write the results to <file> rather than stdout.", 'file')
+    parser.addOption(outputOption)
+    sizesOption = QCommandLineOption(['s', 'sizes'],
+            "Lay out graphs of each of the comma separated node <counts>.",
+            'counts', DefaultSizes)
+    parser.addOption(sizesOption)
+    edgesOption = QCommandLineOption(['e', 'edges-per-node'],
+            "Give each graph <ratio> times as many edges as nodes.", 'ratio',
+            '2')
+    parser.addOption(edgesOption)
+    ticksOption = QCommandLineOption(['t', 'ticks'],
+            "Stop a graph that has not settled after <count> ticks.",
+            'count', '1000')
+    parser.addOption(ticksOption)
+    timeoutOption = QCommandLineOption(['timeout'],
+            "Stop a graph that has not settled after <seconds>.", 'seconds',
+            '120')
+    parser.addOption(timeoutOption)
+    seedOption = QCommandLineOption(['seed'],
+            "Generate the graphs from the random <seed>.", 'seed', '1')
+    parser.addOption(seedOption)
+    parser.process(app)
+
+    try:
+        sizes = [int(size) for size in parser.value(sizesOption).split(',')]
+        edgesPerNode = float(parser.value(edgesOption))
+        maxTicks = max(1, int(parser.value(ticksOption)))
+        timeout = float(parser.value(timeoutOption))
+        seed = int(parser.value(seedOption))
+    except ValueError:
+        parser.showHelp(1)
+
+    context = multiprocessing.get_context('spawn')
+    graphs = []
+    for nodeCount in sizes:
+        with context.Pool(1) as pool:
+            graphs.append(pool.apply(measure, (nodeCount,
+                    int(nodeCount * edgesPerNode), seed, maxTicks, timeout)))
+
+    results = {
+        'edgesPerNode': edgesPerNode,
+        'maxTicks': maxTicks,
+        'timeout': timeout,
+        'seed': seed,
+        'graphs': graphs,
+    }
+
+    if parser.isSet(outputOption):
+        with open(parser.value(outputOption), 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
@@ -42,19 +42,28 @@
 #############################################################################
 
 
-from PyQt5.QtCore import (QAbstractItemModel, QFile, QIODevice,
-        QItemSelectionModel, QModelIndex, Qt)
-from PyQt5.QtWidgets import QApplication, QMainWindow
+from PyQt5.QtCore import (QAbstractItemModel, QCommandLineParser, QFile,
+        QIODevice, QItemSelectionModel, QModelIndex, Qt)
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox
 
 import editabletreemodel_rc
 from ui_mainwindow import Ui_MainWindow
 
 
 class TreeItem(object):
+    # An outline can have millions of items, so keep them small and have
+    # each remember its row rather than search its parent's children for it.
+    __slots__ = ('parentItem', 'itemData', 'childItems', 'rowNumber')
+
     def __init__(self, data, parent=None):
         self.parentItem = parent
         self.itemData = data
         self.childItems = []
+        self.rowNumber = 0
+
+    def appendChild(self, item):
+        item.rowNumber = len(self.childItems)
+        self.childItems.append(item)
 
     def child(self, row):
         return self.childItems[row]
@@ -63,9 +72,7 @@ class TreeItem(object):
         return len(self.childItems)
 
     def childNumber(self):
-        if self.parentItem != None:
-            return self.parentItem.childItems.index(self)
-        return 0
+        return self.rowNumber
 
     def columnCount(self):
         return len(self.itemData)
@@ -77,10 +84,10 @@ class TreeItem(object):
         if position < 0 or position > len(self.childItems):
             return False
 
-        for row in range(count):
-            data = [None for v in range(columns)]
-            item = TreeItem(data, self)
-            self.childItems.insert(position, item)
+        self.childItems[position:position] = [
+                TreeItem([None for v in range(columns)], self)
+                for row in range(count)]
+        self.renumberChildren(position)
 
         return True
 
@@ -103,8 +110,8 @@ class TreeItem(object):
         if position < 0 or position + count > len(self.childItems):
             return False
 
-        for row in range(count):
-            self.childItems.pop(position)
+        del self.childItems[position:position + count]
+        self.renumberChildren(position)
 
         return True
 
@@ -120,6 +127,11 @@ class TreeItem(object):
 
         return True
 
+    def renumberChildren(self, position):
+        # Only the children from position on have moved.
+        for row in range(position, len(self.childItems)):
+            self.childItems[row].rowNumber = row
+
     def setData(self, column, value):
         if column < 0 or column >= len(self.itemData):
             return False
@@ -135,7 +147,8 @@ class TreeModel(QAbstractItemModel):
 
         rootData = [header for header in headers]
         self.rootItem = TreeItem(rootData)
-        self.setupModelData(data.split("\n"), self.rootItem)
+        self.setupModelData(bytes(data).decode('utf-8', 'replace').split("\n"),
+                self.rootItem)
 
     def columnCount(self, parent=QModelIndex()):
         return self.rootItem.columnCount()
@@ -259,27 +272,25 @@ class TreeModel(QAbstractItemModel):
         parents = [parent]
         indentations = [0]
 
-        number = 0
+        columns = self.rootItem.columnCount()
 
-        while number < len(lines):
-            position = 0
-            while position < len(lines[number]):
-                if lines[number][position] != " ":
-                    break
-                position += 1
-
-            lineData = lines[number][position:].trimmed()
+        for line in lines:
+            lineData = line.lstrip(" ")
+            position = len(line) - len(lineData)
+            lineData = lineData.strip()
 
             if lineData:
-                # Read the column data from the rest of the line.
-                columnData = [s for s in lineData.split('\t') if s]
+                # Read the column data from the rest of the line, with one
+                # value for each column of the model.
+                columnData = [s for s in lineData.split('\t') if s][:columns]
+                columnData += [None] * (columns - len(columnData))
 
                 if position > indentations[-1]:
                     # The last child of the current parent is now the new
                     # parent unless the current parent has no children.
 
-                    if parents[-1].childCount() > 0:
-                        parents.append(parents[-1].child(parents[-1].childCount() - 1))
+                    if parents[-1].childItems:
+                        parents.append(parents[-1].childItems[-1])
                         indentations.append(position)
 
                 else:
@@ -288,25 +299,22 @@ class TreeModel(QAbstractItemModel):
                         indentations.pop()
 
                 # Append a new item to the current parent's list of children.
-                parent = parents[-1]
-                parent.insertChildren(parent.childCount(), 1,
-                        self.rootItem.columnCount())
-                for column in range(len(columnData)):
-                    parent.child(parent.childCount() -1).setData(column, columnData[column])
-
-            number += 1
+                parents[-1].appendChild(TreeItem(columnData, parents[-1]))
 
 
 class MainWindow(QMainWindow, Ui_MainWindow):
-    def __init__(self, parent=None):
+    def __init__(self, fileName=':/default.txt', parent=None):
         super(MainWindow, self).__init__(parent)
 
         self.setupUi(self)
 
         headers = ("Title", "Description")
 
-        file = QFile(':/default.txt')
-        file.open(QIODevice.ReadOnly)
+        file = QFile(fileName)
+        if not file.open(QIODevice.ReadOnly):
+            QMessageBox.warning(self, "Editable Tree Model",
+                    "Cannot read file %s:\n%s." % (fileName,
+                            file.errorString()))
         model = TreeModel(headers, file.readAll())
         file.close()
 
@@ -417,6 +425,14 @@ if __name__ == '__main__':
     import sys
 
     app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Editable Tree Model Example")
+    parser.addHelpOption()
+    parser.addPositionalArgument('file',
+            "The outline to show, one item per line, indented with spaces "
+            "and with tabs between columns.", '[file]')
+    parser.process(app)
+
+    window = MainWindow(*parser.positionalArguments()[:1])
     window.show()
     sys.exit(app.exec_())
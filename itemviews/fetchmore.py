@@ -43,20 +43,92 @@
 #############################################################################
 
 
-from PyQt5.QtCore import (pyqtSignal, QAbstractListModel, QDir, QLibraryInfo,
-        QModelIndex, Qt)
+import os
+import time
+
+from PyQt5.QtCore import (pyqtSignal, QAbstractListModel, QLibraryInfo,
+        QModelIndex, QMutex, QMutexLocker, Qt, QThread, QTimer)
 from PyQt5.QtWidgets import (QApplication, QGridLayout, QLabel, QLineEdit,
         QListView, QSizePolicy, QTextBrowser, QWidget)
 
 
+class DirectoryLister(QThread):
+    """Lists the entries of a directory in batches.
+
+    Entries are kept in the order the file system returns them until they
+    are taken with takeEntries(). The model takes them every BatchInterval
+    seconds, and as soon as BatchSize are waiting, so that a slow directory
+    still shows the entries found so far while the next one is awaited.
+    """
+
+    # The listers that were stopped while stuck in a directory, which are
+    # kept until they finish as a running QThread mustn't be destroyed.
+    detached = set()
+
+    entriesAvailable = pyqtSignal()
+
+    BatchSize = 1000
+    BatchInterval = 0.1
+
+    def __init__(self, path, parent=None):
+        super(DirectoryLister, self).__init__(parent)
+
+        self.path = path
+        self.abort = False
+
+        self.mutex = QMutex()
+        self.entries = []
+
+    def cancel(self):
+        self.abort = True
+
+    def detach(self):
+        self.setParent(None)
+        DirectoryLister.detached.add(self)
+        self.finished.connect(self.release)
+
+    def release(self):
+        DirectoryLister.detached.discard(self)
+
+    def takeEntries(self):
+        locker = QMutexLocker(self.mutex)
+
+        names = self.entries
+        self.entries = []
+        return names
+
+    def run(self):
+        try:
+            with os.scandir(self.path or '.') as entries:
+                for entry in entries:
+                    if self.abort:
+                        return
+
+                    self.mutex.lock()
+                    self.entries.append(entry.name)
+                    full = len(self.entries) % self.BatchSize == 0
+                    self.mutex.unlock()
+
+                    if full:
+                        self.entriesAvailable.emit()
+        except OSError:
+            pass
+
+
 class FileListModel(QAbstractListModel):
     numberPopulated = pyqtSignal(int)
+    loadingFinished = pyqtSignal(int)
 
     def __init__(self, parent=None):
         super(FileListModel, self).__init__(parent)
 
-        self.fileCount = 0    
+        self.fileCount = 0
         self.fileList = []
+        self.lister = None
+
+        self.batchTimer = QTimer(self)
+        self.batchTimer.setInterval(int(DirectoryLister.BatchInterval * 1000))
+        self.batchTimer.timeout.connect(self.takeEntries)
 
     def rowCount(self, parent=QModelIndex()):
         return self.fileCount
@@ -88,7 +160,7 @@ class FileListModel(QAbstractListModel):
         itemsToFetch = min(100, remainder)
 
         self.beginInsertRows(QModelIndex(), self.fileCount,
-                self.fileCount + itemsToFetch)
+                self.fileCount + itemsToFetch - 1)
 
         self.fileCount += itemsToFetch
 
@@ -97,19 +169,76 @@ class FileListModel(QAbstractListModel):
         self.numberPopulated.emit(itemsToFetch)
 
     def setDirPath(self, path):
-        dir = QDir(path)
+        # A lister that is given up on deletes itself once it has stopped,
+        # and anything it had already found is ignored.
+        if self.lister is not None:
+            self.lister.cancel()
+            self.lister = None
 
         self.beginResetModel()
-        self.fileList = dir.entryList()
+        self.fileList = []
         self.fileCount = 0
         self.endResetModel()
 
+        self.lister = DirectoryLister(path, self)
+        self.lister.entriesAvailable.connect(self.takeEntries)
+        self.lister.finished.connect(self.listerFinished)
+        self.lister.finished.connect(self.lister.deleteLater)
+        self.lister.start()
+        self.batchTimer.start()
+
+    def isLoading(self):
+        return self.lister is not None
+
+    def stopLoading(self, timeout = 1000):
+        # Wait for every lister, including any given up on, so that none is
+        # still running when the model is destroyed. One that is stuck in a
+        # directory that isn't responding is left to finish on its own.
+        self.lister = None
+        self.batchTimer.stop()
+        listers = self.findChildren(DirectoryLister)
+        for lister in listers:
+            lister.cancel()
+
+        deadline = time.monotonic() + timeout / 1000
+        for lister in listers:
+            remaining = max(0, int((deadline - time.monotonic()) * 1000))
+            if not lister.wait(remaining):
+                lister.entriesAvailable.disconnect(self.takeEntries)
+                lister.finished.disconnect(self.listerFinished)
+                lister.detach()
+
+    def takeEntries(self):
+        # A lister that was given up on may still have asked for its entries
+        # to be taken, and then those of the current one are.
+        if self.lister is None:
+            return
+
+        names = self.lister.takeEntries()
+        if not names:
+            return
+
+        # The view only asks for more rows when it is scrolled, so if it has
+        # already been given every row there was then give it the first new
+        # ones now.
+        caughtUp = self.fileCount == len(self.fileList)
+        self.fileList.extend(names)
+        if caughtUp:
+            self.fetchMore(QModelIndex())
+
+    def listerFinished(self):
+        if self.sender() is self.lister:
+            self.takeEntries()
+            self.batchTimer.stop()
+            self.lister = None
+            self.loadingFinished.emit(len(self.fileList))
+
 
 class Window(QWidget):
     def __init__(self, parent=None):
         super(Window, self).__init__(parent)
 
-        model = FileListModel(self)
+        self.model = model = FileListModel(self)
         model.setDirPath(QLibraryInfo.location(QLibraryInfo.PrefixPath))
 
         label = QLabel("Directory")
@@ -125,6 +254,7 @@ class Window(QWidget):
         lineEdit.textChanged.connect(model.setDirPath)
         lineEdit.textChanged.connect(self.logViewer.clear)
         model.numberPopulated.connect(self.updateLog)
+        model.loadingFinished.connect(self.loadingFinished)
 
         layout = QGridLayout()
         layout.addWidget(label, 0, 0)
@@ -135,9 +265,16 @@ class Window(QWidget):
         self.setLayout(layout)
         self.setWindowTitle("Fetch More Example")
 
+    def closeEvent(self, event):
+        self.model.stopLoading()
+        super(Window, self).closeEvent(event)
+
     def updateLog(self, number):
         self.logViewer.append("%d items added." % number)
 
+    def loadingFinished(self, number):
+        self.logViewer.append("%d items found." % number)
+
 
 if __name__ == '__main__':
 
@@ -148,4 +285,9 @@ if __name__ == '__main__':
     window = Window()
     window.show()
 
-    sys.exit(app.exec_())
+    status = app.exec_()
+    if DirectoryLister.detached:
+        # A thread stuck in a directory can neither be waited for nor
+        # destroyed while it runs, so leave without tearing anything down.
+        os._exit(status)
+    sys.exit(status)
@@ -51,8 +51,8 @@
 #############################################################################
 
 
-from PyQt5.QtCore import (QAbstractItemModel, QFileInfo, QItemSelectionModel,
-        QModelIndex, Qt)
+from PyQt5.QtCore import (QAbstractItemModel, QCommandLineOption,
+        QCommandLineParser, QFileInfo, QItemSelectionModel, QModelIndex, Qt)
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (QAbstractItemView, QApplication,
         QFileIconProvider, QListView, QSplitter, QTableView, QTreeView)
@@ -62,41 +62,47 @@ images_dir = QFileInfo(__file__).absolutePath() + '/images'
 
 
 class Node(object):
-    def __init__(self, parent = None):
+    """An item whose children have been asked for.
+
+    Rows are otherwise implicit: an index only holds the node of its
+    parent, so items are not allocated until a view looks inside them.
+    """
+
+    __slots__ = ('parent', 'row', 'children')
+
+    def __init__(self, parent = None, row = 0):
         self.parent = parent
-        self.children = []
+        self.row = row
+        self.children = None
 
 
 class Model(QAbstractItemModel):
+    ItemFlags = Qt.ItemIsDragEnabled | Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
     def __init__(self, rows, columns, parent = None):
         super(Model, self).__init__(parent)
         self.services = QIcon(images_dir + '/services.png')
         self.rc = rows
         self.cc = columns
-        self.tree = [Node() for node in range(rows)]
+        self.tree = Node()
         self.iconProvider = QFileIconProvider()
 
     def index(self, row, column, parent):
         if row < self.rc and row >= 0 and column < self.cc and column >= 0:
-            parentNode = parent.internalPointer()
-            childNode = self.node(row, parentNode)
-            if childNode is not None:
-                return self.createIndex(row, column, childNode)
+            if parent.isValid():
+                parentNode = self.node(parent.row(), parent.internalPointer())
+            else:
+                parentNode = self.tree
+            return self.createIndex(row, column, parentNode)
         return QModelIndex()
 
     def parent(self, child):
-        if isinstance(child, QModelIndex):
-            # parent of QModelIndex child
-            if child.isValid():
-                childNode = child.internalPointer()
-                parentNode = self.parent(childNode)
-                if parentNode:
-                    return self.createIndex(self.row(parentNode), 0, parentNode)
-            return QModelIndex()
-        else:
-            # parent of Node
-            if child:
-                return child.parent
+        if child.isValid():
+            parentNode = child.internalPointer()
+            if parentNode is not self.tree:
+                return self.createIndex(self.row(parentNode), 0,
+                        parentNode.parent)
+        return QModelIndex()
 
     def rowCount(self, parent):
         if parent.isValid() and parent.column() != 0:
@@ -132,27 +138,37 @@ class Model(QAbstractItemModel):
     def flags(self, index):
         if not index.isValid():
             return 0
-        return Qt.ItemIsDragEnabled | super(Model, self).flags(index)
+        return self.ItemFlags
 
     def node(self, row, parent):
-        if parent and not parent.children:
-            parent.children = [Node(parent) for node in range(self.rc)]
-        if parent:
-            return parent.children[row]
-        else:
-            return self.tree[row]
+        # The node of the item at row within parent, created the first time
+        # it is needed.
+        if parent.children is None:
+            parent.children = {}
+        node = parent.children.get(row)
+        if node is None:
+            node = parent.children[row] = Node(parent, row)
+        return node
 
     def row(self, node):
-        if node.parent:
-            return node.parent.children.index(node)
-        else:
-            return self.tree.index(node)
+        return node.row
 
 
 def main(args):
     app = QApplication(args)
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Interview Example")
+    parser.addHelpOption()
+    rowsOption = QCommandLineOption(['r', 'rows'],
+            "Give every item <count> rows of children.", 'count', '1000')
+    parser.addOption(rowsOption)
+    parser.process(app)
+    try:
+        rows = int(parser.value(rowsOption))
+    except ValueError:
+        parser.showHelp(1)
     page = QSplitter()
-    data = Model(1000, 10, page)
+    data = Model(rows, 10, page)
     selections = QItemSelectionModel(data)
     table = QTableView()
     table.setModel(data)
@@ -42,9 +42,11 @@
 #############################################################################
 
 
-from PyQt5.QtCore import (QAbstractTableModel, QDir, QModelIndex, QRect,
-        QRectF, QSize, Qt)
-from PyQt5.QtGui import QBrush, qGray, QImage, QPainter
+import numpy
+
+from PyQt5.QtCore import (QAbstractTableModel, QDir, QModelIndex, QPointF,
+        QRect, QRectF, QSize, Qt)
+from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap
 from PyQt5.QtPrintSupport import QPrintDialog, QPrinter
 from PyQt5.QtWidgets import (QAbstractItemDelegate, QApplication, QDialog,
         QFileDialog, QHBoxLayout, QLabel, QMainWindow, QMessageBox, QMenu,
@@ -57,38 +59,106 @@ import pixelator_rc
 ItemSize = 256
 
 
+def grayLevels(image):
+    # Return the qGray() of every pixel of an image, row by row, as bytes.
+    if image.isNull():
+        return b''
+
+    # Read the pixels as pixel() returns them, which is as they are stored
+    # in a 32-bit image, with straight alpha for RGBA8888 and premultiplied
+    # for any other format.
+    if image.format() == QImage.Format_RGBA8888:
+        image = image.convertToFormat(QImage.Format_ARGB32)
+    elif image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32,
+            QImage.Format_ARGB32_Premultiplied):
+        image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    pixels = numpy.frombuffer(bits, numpy.uint32).reshape(image.height(),
+            image.bytesPerLine() // 4)[:, :image.width()]
+
+    red = (pixels >> 16) & 0xff
+    green = (pixels >> 8) & 0xff
+    blue = pixels & 0xff
+
+    return ((red * 11 + green * 16 + blue * 5) // 32).astype(
+            numpy.uint8).tobytes()
+
+
 class PixelDelegate(QAbstractItemDelegate):
+    # Circles are drawn from a cache of pixmaps, one for each size, colour and
+    # radius, with the radius rounded to 1/RadiusSteps of a pixel.  Larger
+    # circles, such as those that are printed, are drawn as they are.
+    MaxGlyphSize = 64
+    RadiusSteps = 4
+
     def __init__(self, parent=None):
         super(PixelDelegate, self).__init__(parent)
 
         self.pixelSize = 12
+        self.glyphs = {}
 
     def paint(self, painter, option, index):
-        if option.state & QStyle.State_Selected:
-            painter.fillRect(option.rect, option.palette.highlight())
+        rect = option.rect
+        selected = option.state & QStyle.State_Selected
+        if selected:
+            painter.fillRect(rect, option.palette.highlight())
 
-        size = min(option.rect.width(), option.rect.height())
+        size = min(rect.width(), rect.height())
         brightness = index.model().data(index, Qt.DisplayRole)
         radius = (size/2.0) - (brightness/255.0 * size/2.0)
         if radius == 0.0:
             return
 
+        if selected:
+            color = option.palette.highlightedText().color()
+        else:
+            color = QColor(Qt.black)
+
+        if size <= self.MaxGlyphSize:
+            step = int(radius * self.RadiusSteps + 0.5)
+            if step == 0:
+                return
+
+            ratio = painter.device().devicePixelRatioF()
+            pixmap = self.glyphs.get((size, step, color.rgba(), ratio))
+            if pixmap is None:
+                pixmap = self.glyph(size, step, color, ratio)
+
+            painter.drawPixmap(QPointF(rect.x() + (rect.width() - size) / 2.0,
+                    rect.y() + (rect.height() - size) / 2.0), pixmap)
+            return
+
         painter.save()
         painter.setRenderHint(QPainter.Antialiasing)
         painter.setPen(Qt.NoPen)
-
-        if option.state & QStyle.State_Selected:
-            painter.setBrush(option.palette.highlightedText())
-        else:
-            painter.setBrush(QBrush(Qt.black))
+        painter.setBrush(color)
 
         painter.drawEllipse(QRectF(
-                            option.rect.x() + option.rect.width()/2 - radius,
-                            option.rect.y() + option.rect.height()/2 - radius,
+                            rect.x() + rect.width()/2 - radius,
+                            rect.y() + rect.height()/2 - radius,
                             2*radius, 2*radius))
 
         painter.restore()
 
+    def glyph(self, size, step, color, ratio):
+        pixmap = QPixmap(int(size * ratio + 0.5), int(size * ratio + 0.5))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+
+        radius = step / float(self.RadiusSteps)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(color)
+        painter.drawEllipse(QRectF(size/2.0 - radius, size/2.0 - radius,
+                2*radius, 2*radius))
+        painter.end()
+
+        self.glyphs[size, step, color.rgba(), ratio] = pixmap
+
+        return pixmap
+
     def sizeHint(self, option, index):
         return QSize(self.pixelSize, self.pixelSize)
 
@@ -101,10 +171,12 @@ class ImageModel(QAbstractTableModel):
         super(ImageModel, self).__init__(parent)
 
         self.modelImage = QImage()
+        self.grays = b''
 
     def setImage(self, image):
         self.beginResetModel()
         self.modelImage = QImage(image)
+        self.grays = grayLevels(self.modelImage)
         self.endResetModel()
 
     def rowCount(self, parent):
@@ -117,7 +189,8 @@ class ImageModel(QAbstractTableModel):
         if not index.isValid() or role != Qt.DisplayRole:
             return None
 
-        return qGray(self.modelImage.pixel(index.column(), index.row()))
+        return self.grays[index.row() * self.modelImage.width() +
+                index.column()]
 
     def headerData(self, section, orientation, role):
         if role == Qt.SizeHintRole:
@@ -287,8 +360,11 @@ class MainWindow(QMainWindow):
                 "representation\nof data in a simple custom model.")
 
     def updateView(self):
-        self.view.resizeColumnsToContents()
-        self.view.resizeRowsToContents()
+        # Every pixel is the same size, so there is no need to ask the delegate
+        # about each one as resizeColumnsToContents() would.
+        size = self.view.itemDelegate().pixelSize
+        self.view.horizontalHeader().setDefaultSectionSize(size)
+        self.view.verticalHeader().setDefaultSectionSize(size)
 
 
 if __name__ == '__main__':
@@ -42,11 +42,53 @@
 #############################################################################
 
 
-from PyQt5.QtCore import QAbstractItemModel, QFile, QIODevice, QModelIndex, Qt
-from PyQt5.QtWidgets import QApplication, QFileDialog, QMainWindow, QTreeView
+import codecs
+import collections
+import re
+from array import array
+
+import numpy
+
+from PyQt5.QtCore import (QAbstractItemModel, QCommandLineOption,
+        QCommandLineParser, QFile, QIODevice, QModelIndex, Qt,
+        QXmlStreamReader)
+from PyQt5.QtWidgets import (QApplication, QFileDialog, QMainWindow,
+        QMessageBox, QTreeView)
 from PyQt5.QtXml import QDomDocument
 
 
+# The kinds of node an XmlStreamModel keeps in its index.
+DocumentNode, ElementNode, TextNode, CDataNode, CommentNode, \
+        ProcessingInstructionNode, DeclarationNode = range(7)
+
+EncodingRe = re.compile(br'^<\?xml[^>]*encoding\s*=\s*["\']([A-Za-z0-9._-]+)')
+
+DeclarationRe = re.compile(
+        r'(version|encoding|standalone)\s*=\s*(["\'])(.*?)\2')
+
+
+def oneLine(text):
+    return ' '.join(text.split('\n'))
+
+
+def sniffEncoding(head):
+    """Return the codec and the length of any byte order mark of an XML
+    file that starts with head."""
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8'),
+            (codecs.BOM_UTF16_LE, 'utf-16-le'),
+            (codecs.BOM_UTF16_BE, 'utf-16-be')):
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    match = EncodingRe.match(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name, 0
+        except LookupError:
+            pass
+    return 'utf-8', 0
+
+
 class DomItem(object):
     def __init__(self, node, row, parent=None):
         self.domNode = node
@@ -179,10 +221,313 @@ class DomModel(QAbstractItemModel):
         return parentItem.node().childNodes().count()
 
 
+class XmlStreamModel(QAbstractItemModel):
+    """Shows an XML file the way DomModel shows its document, without
+    keeping the document in memory.
+
+    The file is read once with a QXmlStreamReader to build a table of where
+    each node starts and ends in the file, its parent and its row.  Nodes
+    are only read back from the file, and their attributes formatted, when
+    a view asks for them, and the most recently used are cached.
+    """
+
+    ChunkSize = 1 << 16
+    CacheSize = 1000
+    MaxValueLength = 4096
+
+    def __init__(self, path, parent=None):
+        super(XmlStreamModel, self).__init__(parent)
+
+        self.path = path
+        self.file = None
+        self.dtd = ''
+        self.errorString = ''
+        self.cache = collections.OrderedDict()
+        self.indexFile()
+
+    def indexFile(self):
+        starts = array('q', [0])
+        ends = array('q', [0])
+        parents = array('i', [-1])
+        kinds = array('b', [DocumentNode])
+
+        # The offset, in the UTF-16 units the reader counts in, and the
+        # byte position in the file of the start of each chunk.
+        checkpointOffsets = array('q')
+        checkpointPositions = array('q')
+
+        def addNode(kind, start, end, parent):
+            starts.append(start)
+            ends.append(end)
+            parents.append(parent)
+            kinds.append(kind)
+            return len(kinds) - 1
+
+        reader = QXmlStreamReader()
+        reader.setNamespaceProcessing(False)
+        stack = [0]
+        # A run of character data, which only becomes a text node once it
+        # turns out not to be all whitespace.
+        textStart = None
+        textNode = None
+
+        self.file = open(self.path, 'rb')
+        self.encoding, position = sniffEncoding(self.file.read(1024))
+        self.file.seek(position)
+        decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        offset = 0
+        tokenEnd = 0
+        finished = False
+
+        readNext = reader.readNext
+        characterOffset = reader.characterOffset
+        Invalid = QXmlStreamReader.Invalid
+        textTokens = (QXmlStreamReader.Characters,
+                QXmlStreamReader.EntityReference)
+
+        while not finished:
+            data = self.file.read(self.ChunkSize)
+            checkpointOffsets.append(offset)
+            checkpointPositions.append(position - len(decoder.getstate()[0]))
+            text = decoder.decode(data, not data)
+            position += len(data)
+            offset += len(text.encode('utf-16-le')) // 2
+            reader.addData(text)
+            if not data:
+                reader.addData('')
+
+            while True:
+                # A token cut short by the end of a chunk has already been
+                # partly read when it is finally reported.
+                token = readNext()
+                if token != Invalid:
+                    before = tokenEnd
+                    after = tokenEnd = characterOffset()
+
+                if token in textTokens and not reader.isCDATA():
+                    if textNode is not None:
+                        ends[textNode] = after
+                    else:
+                        if textStart is None:
+                            textStart = before
+                        if not reader.isWhitespace():
+                            textNode = addNode(TextNode, textStart, after,
+                                    stack[-1])
+                    continue
+
+                if token == Invalid:
+                    if reader.error() != \
+                            QXmlStreamReader.PrematureEndOfDocumentError or \
+                            not data:
+                        finished = True
+                    break
+
+                textStart = textNode = None
+                if token == QXmlStreamReader.StartDocument:
+                    if reader.documentVersion():
+                        addNode(DeclarationNode, before, after, 0)
+                elif token == QXmlStreamReader.DTD:
+                    self.dtd = reader.text()
+                elif token == QXmlStreamReader.StartElement:
+                    stack.append(addNode(ElementNode, before, after,
+                            stack[-1]))
+                elif token == QXmlStreamReader.EndElement:
+                    stack.pop()
+                elif token == QXmlStreamReader.Characters:
+                    addNode(CDataNode, before, after, stack[-1])
+                elif token == QXmlStreamReader.Comment:
+                    addNode(CommentNode, before, after, stack[-1])
+                elif token == QXmlStreamReader.ProcessingInstruction:
+                    addNode(ProcessingInstructionNode, before, after,
+                            stack[-1])
+                elif token == QXmlStreamReader.EndDocument:
+                    finished = True
+                    break
+
+        if reader.hasError():
+            self.errorString = reader.errorString()
+
+        self.starts = numpy.frombuffer(starts, numpy.int64)
+        self.ends = numpy.frombuffer(ends, numpy.int64)
+        self.parents = numpy.frombuffer(parents, numpy.int32)
+        self.kinds = numpy.frombuffer(kinds, numpy.int8)
+        self.checkpointOffsets = numpy.frombuffer(checkpointOffsets,
+                numpy.int64)
+        self.checkpointPositions = numpy.frombuffer(checkpointPositions,
+                numpy.int64)
+
+        # The children of every node, in order, one node after another.
+        self.children = (numpy.argsort(self.parents[1:], kind='stable') +
+                1).astype(numpy.int32)
+        self.childCounts = numpy.bincount(self.parents[1:],
+                minlength=len(self.parents)).astype(numpy.int32)
+        self.firstChildren = numpy.cumsum(self.childCounts) - self.childCounts
+        self.rows = numpy.zeros(len(self.parents), numpy.int32)
+        self.rows[self.children] = numpy.arange(len(self.children)) - \
+                self.firstChildren[self.parents[self.children]]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def readText(self, start, end):
+        checkpoint = numpy.searchsorted(self.checkpointOffsets, start,
+                'right') - 1
+        skip = int(start - self.checkpointOffsets[checkpoint])
+        length = int(end - start)
+
+        self.file.seek(int(self.checkpointPositions[checkpoint]))
+        decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        units = bytearray()
+        while len(units) < 2 * (skip + length):
+            data = self.file.read(self.ChunkSize)
+            units += decoder.decode(data, not data).encode('utf-16-le')
+            if not data:
+                break
+        return units[2 * skip:2 * (skip + length)].decode('utf-16-le',
+                'replace')
+
+    def readNode(self, node):
+        # Returns the name, attributes and value of a node as DomModel would
+        # show them.
+        kind = self.kinds[node]
+        start = self.starts[node]
+        end = min(self.ends[node], start + self.MaxValueLength)
+
+        # The reader may have read a few characters of a token by the time it
+        # reports the one before it, so a node's offsets can be a little out.
+        # Text always ends just before a '<', and markup starts at the first
+        # '<' after the end of the token before it.
+        reader = QXmlStreamReader()
+        reader.setNamespaceProcessing(False)
+        text = self.readText(start, end)
+        if kind == TextNode:
+            if text.endswith('<'):
+                text = text[:-1]
+            reader.addData(self.dtd + '<text>' + text + '</text>')
+        else:
+            before = self.readText(max(0, start - 8), start)
+            before = before[before.rfind('>') + 1:]
+            if '<' in before:
+                text = before[before.index('<'):] + text
+            else:
+                text = text[text.find('<'):]
+            if kind == DeclarationNode:
+                # The reader doesn't say whether standalone='no' was given,
+                # so show the pseudo-attributes as written, as QDom does.
+                return 'xml', '', ' '.join("%s='%s'" % (name, value)
+                        for name, _, value in DeclarationRe.findall(text))
+            if kind == ElementNode:
+                # The reader needs more than a short tag to start reading.
+                reader.addData(self.dtd + text + ' ')
+            elif kind == CDataNode:
+                reader.addData('<text>' + text + '</text>')
+            else:
+                reader.addData(text)
+
+        value = []
+        while not reader.atEnd():
+            token = reader.readNext()
+            if token == QXmlStreamReader.Invalid:
+                break
+            if kind == ElementNode and \
+                    token == QXmlStreamReader.StartElement:
+                attributes = ['%s="%s"' % (attribute.qualifiedName(),
+                        attribute.value())
+                        for attribute in reader.attributes()]
+                return reader.qualifiedName(), ' '.join(attributes), ''
+            if kind == CommentNode and token == QXmlStreamReader.Comment:
+                return '#comment', '', oneLine(reader.text())
+            if kind == ProcessingInstructionNode and \
+                    token == QXmlStreamReader.ProcessingInstruction:
+                return (reader.processingInstructionTarget(), '',
+                        oneLine(reader.processingInstructionData()))
+            if token == QXmlStreamReader.Characters:
+                value.append(reader.text())
+
+        if kind == CDataNode:
+            return '#cdata-section', '', oneLine(''.join(value))
+        if not value:
+            # Fall back to the text as it is in the file, for example when
+            # it refers to entities that aren't declared.
+            value = [text]
+        return '#text', '', oneLine(''.join(value))
+
+    def node(self, node):
+        record = self.cache.get(node)
+        if record is None:
+            record = self.cache[node] = self.readNode(node)
+            if len(self.cache) > self.CacheSize:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(node)
+        return record
+
+    def columnCount(self, parent):
+        return 3
+
+    def data(self, index, role):
+        if not index.isValid():
+            return None
+
+        if role != Qt.DisplayRole:
+            return None
+
+        return self.node(index.internalId())[index.column()]
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            if section == 0:
+                return "Name"
+
+            if section == 1:
+                return "Attributes"
+
+            if section == 2:
+                return "Value"
+
+        return None
+
+    def index(self, row, column, parent):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+
+        parentNode = parent.internalId() if parent.isValid() else 0
+        node = self.children[self.firstChildren[parentNode] + row]
+        return self.createIndex(row, column, int(node))
+
+    def parent(self, child):
+        if not child.isValid():
+            return QModelIndex()
+
+        parentNode = int(self.parents[child.internalId()])
+        if parentNode <= 0:
+            return QModelIndex()
+
+        return self.createIndex(int(self.rows[parentNode]), 0, parentNode)
+
+    def rowCount(self, parent):
+        if parent.column() > 0:
+            return 0
+
+        parentNode = parent.internalId() if parent.isValid() else 0
+        return int(self.childCounts[parentNode])
+
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, useDom=False):
         super(MainWindow, self).__init__()
 
+        # Whether to read files into a QDomDocument rather than index them.
+        self.useDom = useDom
+
         self.fileMenu = self.menuBar().addMenu("&File")
         self.fileMenu.addAction("&Open...", self.openFile, "Ctrl+O")
         self.fileMenu.addAction("E&xit", self.close, "Ctrl+Q")
@@ -195,22 +540,48 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.view)
         self.setWindowTitle("Simple DOM Model")
 
-    def openFile(self):
-        filePath, _ = QFileDialog.getOpenFileName(self, "Open File",
-                self.xmlPath, "XML files (*.xml);;HTML files (*.html);;"
-                "SVG files (*.svg);;User Interface files (*.ui)")
+    def openFile(self, filePath=None):
+        if not filePath:
+            filePath, _ = QFileDialog.getOpenFileName(self, "Open File",
+                    self.xmlPath, "XML files (*.xml);;HTML files (*.html);;"
+                    "SVG files (*.svg);;User Interface files (*.ui)")
 
         if filePath:
-            f = QFile(filePath)
-            if f.open(QIODevice.ReadOnly):
-                document = QDomDocument()
-                if document.setContent(f):
-                    newModel = DomModel(document, self)
-                    self.view.setModel(newModel)
-                    self.model = newModel
-                    self.xmlPath = filePath
-
-                f.close()
+            if self.useDom:
+                f = QFile(filePath)
+                if f.open(QIODevice.ReadOnly):
+                    document = QDomDocument()
+                    if document.setContent(f):
+                        self.setModel(DomModel(document, self))
+                        self.xmlPath = filePath
+
+                    f.close()
+                return
+
+            try:
+                newModel = XmlStreamModel(filePath, self)
+            except EnvironmentError as e:
+                QMessageBox.warning(self, "Simple DOM Model",
+                        "Cannot read file %s:\n%s." % (filePath, e))
+                return
+
+            if newModel.errorString:
+                QMessageBox.warning(self, "Simple DOM Model",
+                        "Parse error in file %s:\n%s." % (filePath,
+                                newModel.errorString))
+                newModel.close()
+                newModel.deleteLater()
+                return
+
+            self.setModel(newModel)
+            self.xmlPath = filePath
+
+    def setModel(self, model):
+        self.view.setModel(model)
+        if isinstance(self.model, XmlStreamModel):
+            self.model.close()
+        self.model.deleteLater()
+        self.model = model
 
 
 if __name__ == '__main__':
@@ -218,7 +589,18 @@ if __name__ == '__main__':
     import sys
 
     app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Simple DOM Model Example")
+    parser.addHelpOption()
+    parser.addPositionalArgument('file', "The XML file to open.", '[file]')
+    domOption = QCommandLineOption(['d', 'dom'],
+            "Read the whole file into a QDomDocument.")
+    parser.addOption(domOption)
+    parser.process(app)
+
+    window = MainWindow(parser.isSet(domOption))
     window.resize(640, 480)
     window.show()
+    if parser.positionalArguments():
+        window.openFile(parser.positionalArguments()[0])
     sys.exit(app.exec_())
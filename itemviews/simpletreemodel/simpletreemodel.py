@@ -42,19 +42,26 @@
 #############################################################################
 
 
-from PyQt5.QtCore import QAbstractItemModel, QFile, QIODevice, QModelIndex, Qt
-from PyQt5.QtWidgets import QApplication, QTreeView
+from PyQt5.QtCore import (QAbstractItemModel, QCommandLineParser, QFile,
+        QIODevice, QModelIndex, Qt)
+from PyQt5.QtWidgets import QApplication, QMessageBox, QTreeView
 
 import simpletreemodel_rc
 
 
 class TreeItem(object):
+    # An outline can have millions of items, so keep them small and have
+    # each remember its row rather than search its parent's children for it.
+    __slots__ = ('parentItem', 'itemData', 'childItems', 'rowNumber')
+
     def __init__(self, data, parent=None):
         self.parentItem = parent
         self.itemData = data
         self.childItems = []
+        self.rowNumber = 0
 
     def appendChild(self, item):
+        item.rowNumber = len(self.childItems)
         self.childItems.append(item)
 
     def child(self, row):
@@ -76,10 +83,7 @@ class TreeItem(object):
         return self.parentItem
 
     def row(self):
-        if self.parentItem:
-            return self.parentItem.childItems.index(self)
-
-        return 0
+        return self.rowNumber
 
 
 class TreeModel(QAbstractItemModel):
@@ -87,7 +91,8 @@ class TreeModel(QAbstractItemModel):
         super(TreeModel, self).__init__(parent)
 
         self.rootItem = TreeItem(("Title", "Summary"))
-        self.setupModelData(data.split('\n'), self.rootItem)
+        self.setupModelData(bytes(data).decode('utf-8', 'replace').split('\n'),
+                self.rootItem)
 
     def columnCount(self, parent):
         if parent.isValid():
@@ -160,16 +165,10 @@ class TreeModel(QAbstractItemModel):
         parents = [parent]
         indentations = [0]
 
-        number = 0
-
-        while number < len(lines):
-            position = 0
-            while position < len(lines[number]):
-                if lines[number][position] != ' ':
-                    break
-                position += 1
-
-            lineData = lines[number][position:].trimmed()
+        for line in lines:
+            lineData = line.lstrip(' ')
+            position = len(line) - len(lineData)
+            lineData = lineData.strip()
 
             if lineData:
                 # Read the column data from the rest of the line.
@@ -179,8 +178,8 @@ class TreeModel(QAbstractItemModel):
                     # The last child of the current parent is now the new
                     # parent unless the current parent has no children.
 
-                    if parents[-1].childCount() > 0:
-                        parents.append(parents[-1].child(parents[-1].childCount() - 1))
+                    if parents[-1].childItems:
+                        parents.append(parents[-1].childItems[-1])
                         indentations.append(position)
 
                 else:
@@ -191,17 +190,25 @@ class TreeModel(QAbstractItemModel):
                 # Append a new item to the current parent's list of children.
                 parents[-1].appendChild(TreeItem(columnData, parents[-1]))
 
-            number += 1
-
 
 if __name__ == '__main__':
 
     import sys
 
     app = QApplication(sys.argv)
-
-    f = QFile(':/default.txt')
-    f.open(QIODevice.ReadOnly)
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Simple Tree Model Example")
+    parser.addHelpOption()
+    parser.addPositionalArgument('file',
+            "The outline to show, one item per line, indented with spaces "
+            "and with tabs between columns.", '[file]')
+    parser.process(app)
+
+    f = QFile((parser.positionalArguments() or [':/default.txt'])[0])
+    if not f.open(QIODevice.ReadOnly):
+        QMessageBox.critical(None, "Simple Tree Model",
+                "Cannot read file %s:\n%s." % (f.fileName(), f.errorString()))
+        sys.exit(1)
     model = TreeModel(f.readAll())
     f.close()
 
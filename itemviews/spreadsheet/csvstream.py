@@ -0,0 +1,192 @@
+#############################################################################
+##
+## Copyright (C) 2012 Hans-Peter Jansen <hpj@urpla.net>.
+## Copyright (C) 2011 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+## Contact: Nokia Corporation (qt-info@nokia.com)
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## GNU Lesser General Public License Usage
+## This file may be used under the terms of the GNU Lesser General Public
+## License version 2.1 as published by the Free Software Foundation and
+## appearing in the file LICENSE.LGPL included in the packaging of this
+## file. Please review the following information to ensure the GNU Lesser
+## General Public License version 2.1 requirements will be met:
+## http:#www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights. These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU General
+## Public License version 3.0 as published by the Free Software Foundation
+## and appearing in the file LICENSE.GPL included in the packaging of this
+## file. Please review the following information to ensure the GNU General
+## Public License version 3.0 requirements will be met:
+## http:#www.gnu.org/copyleft/gpl.html.
+##
+## Other Usage
+## Alternatively, this file may be used in accordance with the terms and
+## conditions contained in a signed written agreement between you and Nokia.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+
+import bisect
+import codecs
+import csv
+import itertools
+import os
+
+from PyQt5.QtCore import pyqtSignal, QObject, QTimer
+
+CHUNK_ROWS = 4096
+
+
+def delimiterFor(path):
+    if os.path.splitext(path)[1].lower() in ('.tsv', '.tab'):
+        return '\t'
+    return ','
+
+
+class CsvImporter(QObject):
+    """Streams a CSV or TSV file into a SpreadSheetModel.
+
+    The file is read CHUNK_ROWS rows at a time from the event loop, each
+    chunk being appended to the model in a single batch, so the view stays
+    responsive and fills in while the file loads.  Bytes that aren't valid
+    in the encoding are replaced rather than stopping the import, and any
+    other error stops it and is reported by failed.
+    """
+
+    progress = pyqtSignal('qint64', 'qint64')
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, model, path, delimiter=None, encoding='utf-8-sig',
+            parent=None):
+        super(CsvImporter, self).__init__(parent)
+
+        self.model = model
+        self.path = path
+        self.delimiter = delimiter or delimiterFor(path)
+        self.encoding = encoding
+        self.file = None
+        self.reader = None
+        self.bytesRead = 0
+        self.size = 0
+
+    def start(self):
+        self.file = open(self.path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.reader = csv.reader(self.lines(), delimiter=self.delimiter)
+        QTimer.singleShot(0, self.readChunk)
+
+    def cancel(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def lines(self):
+        # Decoding line by line keeps count of the bytes read so far.
+        decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        for line in self.file:
+            self.bytesRead += len(line)
+            yield decoder.decode(line)
+
+    def readChunk(self):
+        if self.file is None:
+            return
+        # This runs from the event loop, where an exception would abort the
+        # application.
+        try:
+            rows = list(itertools.islice(self.reader, CHUNK_ROWS))
+        except (UnicodeDecodeError, csv.Error, OSError) as e:
+            self.cancel()
+            self.failed.emit("Cannot read %s, line %d:\n%s." % (self.path,
+                    self.reader.line_num, e))
+            return
+        self.model.appendRows(rows)
+        self.progress.emit(self.bytesRead, self.size)
+        if len(rows) == CHUNK_ROWS:
+            QTimer.singleShot(0, self.readChunk)
+        else:
+            self.cancel()
+            self.finished.emit()
+
+
+class CsvExporter(QObject):
+    """Streams the cells of a SpreadSheetModel into a CSV or TSV file.
+
+    Either the computed values or the formulas are written, CHUNK_ROWS rows
+    at a time, and only the texts of the current chunk are ever built.  A
+    write error stops the export and is reported by failed.
+    """
+
+    progress = pyqtSignal('qint64', 'qint64')
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, model, path, formulas=False, delimiter=None,
+            parent=None):
+        super(CsvExporter, self).__init__(parent)
+
+        self.model = model
+        self.path = path
+        self.formulas = formulas
+        self.delimiter = delimiter or delimiterFor(path)
+        self.file = None
+        self.writer = None
+        self.row = 0
+        self.formulaCells = []
+
+    def start(self):
+        self.file = open(self.path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file, delimiter=self.delimiter)
+        self.row = 0
+        self.formulaCells = sorted(self.model.formulas)
+        QTimer.singleShot(0, self.writeChunk)
+
+    def cancel(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def writeChunk(self):
+        if self.file is None:
+            return
+        model = self.model
+        first = self.row
+        last = min(first + CHUNK_ROWS, model.rows)
+        columns = [model.columnTexts(col, first, last)
+                for col in range(model.columnCount())]
+        start = bisect.bisect_left(self.formulaCells, (first, -1))
+        end = bisect.bisect_left(self.formulaCells, (last, -1))
+        for row, col in self.formulaCells[start:end]:
+            if self.formulas:
+                text = model.formulas[(row, col)]
+            else:
+                text = model.text(row, col) or ''
+            columns[col][row - first] = text
+        try:
+            self.writer.writerows(zip(*columns))
+            if last == model.rows:
+                self.cancel()
+        except OSError as e:
+            try:
+                self.cancel()
+            except OSError:
+                self.file = None
+            self.failed.emit("Cannot write %s:\n%s." % (self.path, e))
+            return
+        self.row = last
+        self.progress.emit(last, model.rows)
+        if last < model.rows:
+            QTimer.singleShot(0, self.writeChunk)
+        else:
+            self.finished.emit()
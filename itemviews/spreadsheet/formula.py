@@ -0,0 +1,274 @@
+#############################################################################
+##
+## Copyright (C) 2012 Hans-Peter Jansen <hpj@urpla.net>.
+## Copyright (C) 2011 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+## Contact: Nokia Corporation (qt-info@nokia.com)
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## GNU Lesser General Public License Usage
+## This file may be used under the terms of the GNU Lesser General Public
+## License version 2.1 as published by the Free Software Foundation and
+## appearing in the file LICENSE.LGPL included in the packaging of this
+## file. Please review the following information to ensure the GNU Lesser
+## General Public License version 2.1 requirements will be met:
+## http:#www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights. These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU General
+## Public License version 3.0 as published by the Free Software Foundation
+## and appearing in the file LICENSE.GPL included in the packaging of this
+## file. Please review the following information to ensure the GNU General
+## Public License version 3.0 requirements will be met:
+## http:#www.gnu.org/copyleft/gpl.html.
+##
+## Other Usage
+## Alternatively, this file may be used in accordance with the terms and
+## conditions contained in a signed written agreement between you and Nokia.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+
+import math
+import operator
+import re
+
+import numpy
+
+from util import decode_pos
+
+
+# Formulas either use the original prefix form, e.g. "sum A1 B2" or
+# "+ A1 B2", or start with "=" and hold an expression such as
+# "=SUM(C2:C9) / COUNT(C2:C9) + 2 * (A1 - B1)".  Both compile to the same
+# tuple tree:
+#   ('text', formula)                a plain string
+#   ('num', value), ('str', value)   a literal
+#   ('ref', cell)                    the value of another cell
+#   ('range', r1, c1, r2, c2)        a range, only as a function argument
+#   ('neg', node)
+#   ('binop', op, left, right)       one of + - * /
+#   ('call', name, args)             one of FUNCTIONS
+
+FUNCTIONS = ('SUM', 'AVG', 'MIN', 'MAX', 'COUNT', 'SUMIF')
+
+PREFIX_OPERATORS = ('sum', '+', '-', '*', '/')
+
+TOKEN_RE = re.compile(r'''\s*(?:
+        (?P<number>\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+      | (?P<cell>[A-Za-z]+\d+)
+      | (?P<name>[A-Za-z]+)
+      | (?P<string>"[^"]*")
+      | (?P<symbol>[-+*/(),:])
+    )''', re.VERBOSE)
+
+CRITERIA = (
+    ('<>', operator.ne),
+    ('<=', operator.le),
+    ('>=', operator.ge),
+    ('<', operator.lt),
+    ('>', operator.gt),
+    ('=', operator.eq),
+)
+
+
+def toNumber(value):
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isinf(number) or math.isnan(number):
+        return None
+    return number
+
+
+def tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = TOKEN_RE.match(expression, pos)
+        if match is None:
+            raise ValueError(expression)
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+class Parser(object):
+    """A recursive descent parser of formula expressions."""
+
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def take(self, symbol=None):
+        token = self.peek()
+        if token[0] is None or (symbol is not None and token[1] != symbol):
+            raise ValueError(symbol)
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.expression()
+        if self.pos != len(self.tokens):
+            raise ValueError(self.peek()[1])
+        return node
+
+    def expression(self):
+        node = self.term()
+        while self.peek()[1] in ('+', '-'):
+            op = self.take()[1]
+            node = ('binop', op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek()[1] in ('*', '/'):
+            op = self.take()[1]
+            node = ('binop', op, node, self.factor())
+        return node
+
+    def factor(self):
+        kind, text = self.take()
+        if text == '-':
+            return ('neg', self.factor())
+        if text == '+':
+            return self.factor()
+        if text == '(':
+            node = self.expression()
+            self.take(')')
+            return node
+        if kind == 'number':
+            return ('num', toNumber(text))
+        if kind == 'string':
+            return ('str', text[1:-1])
+        if kind == 'cell':
+            return ('ref', decode_pos(text.upper()))
+        if kind == 'name' and text.upper() in FUNCTIONS:
+            return self.call(text.upper())
+        raise ValueError(text)
+
+    def call(self, name):
+        self.take('(')
+        args = []
+        if self.peek()[1] != ')':
+            args.append(self.argument())
+            while self.peek()[1] == ',':
+                self.take()
+                args.append(self.argument())
+        self.take(')')
+        if name == 'SUMIF' and len(args) not in (2, 3):
+            raise ValueError(name)
+        return ('call', name, tuple(args))
+
+    def argument(self):
+        kind, text = self.peek()
+        if kind == 'cell' and self.pos + 1 < len(self.tokens) and \
+                self.tokens[self.pos + 1][1] == ':':
+            self.pos += 2
+            first = decode_pos(text.upper())
+            second = decode_pos(self.take()[1].upper())
+            return ('range',) + first + second
+        return self.expression()
+
+
+def compileFormula(formula):
+    """Compile the text of a cell into a formula tree."""
+    if formula is None:
+        return ('text', None)
+    if formula.startswith('='):
+        try:
+            return Parser(formula[1:]).parse()
+        except ValueError:
+            return ('text', formula)
+    slist = formula.split(' ')
+    op = slist[0].lower()
+    if op not in PREFIX_OPERATORS:
+        return ('text', formula)
+    first = second = (-1, -1)
+    if len(slist) > 1:
+        first = decode_pos(slist[1])
+    if len(slist) > 2:
+        second = decode_pos(slist[2])
+    if op == 'sum':
+        return ('call', 'SUM', (('range',) + first + second,))
+    return ('binop', op, ('ref', first), ('ref', second))
+
+
+def precedents(node):
+    """Return the single cells and the ranges that a formula tree reads."""
+    cells = []
+    ranges = []
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        kind = node[0]
+        if kind == 'ref':
+            cells.append(node[1])
+        elif kind == 'range':
+            ranges.append(node[1:])
+        elif kind == 'neg':
+            pending.append(node[1])
+        elif kind == 'binop':
+            pending.extend(node[2:])
+        elif kind == 'call':
+            pending.extend(node[2])
+    return cells, ranges
+
+
+def criterionMask(criterion, numbers, numeric, strings):
+    """Return which cells of a range match a SUMIF criterion such as ">10"."""
+    compare = operator.eq
+    operand = criterion
+    if isinstance(criterion, str):
+        for prefix, function in CRITERIA:
+            if criterion.startswith(prefix):
+                compare = function
+                operand = criterion[len(prefix):]
+                break
+    number = toNumber(operand)
+    if number is not None:
+        return numeric & compare(numbers, number)
+    if strings is None or compare not in (operator.eq, operator.ne):
+        matches = numpy.zeros(len(numbers), bool)
+    else:
+        matches = strings == operand
+    if compare is operator.ne:
+        return ~matches
+    return matches
+
+
+def aggregate(name, numbers):
+    """Apply an aggregate function to the array of its numeric arguments."""
+    if name == 'COUNT':
+        return len(numbers)
+    if name == 'SUM':
+        return numbers.sum().item()
+    if not len(numbers):
+        return "nan" if name == 'AVG' else 0
+    if name == 'AVG':
+        return numbers.mean().item()
+    if name == 'MIN':
+        return numbers.min().item()
+    return numbers.max().item()
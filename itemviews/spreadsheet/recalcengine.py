@@ -0,0 +1,350 @@
+#############################################################################
+##
+## Copyright (C) 2012 Hans-Peter Jansen <hpj@urpla.net>.
+## Copyright (C) 2011 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+## Contact: Nokia Corporation (qt-info@nokia.com)
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## GNU Lesser General Public License Usage
+## This file may be used under the terms of the GNU Lesser General Public
+## License version 2.1 as published by the Free Software Foundation and
+## appearing in the file LICENSE.LGPL included in the packaging of this
+## file. Please review the following information to ensure the GNU Lesser
+## General Public License version 2.1 requirements will be met:
+## http:#www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights. These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU General
+## Public License version 3.0 as published by the Free Software Foundation
+## and appearing in the file LICENSE.GPL included in the packaging of this
+## file. Please review the following information to ensure the GNU General
+## Public License version 3.0 requirements will be met:
+## http:#www.gnu.org/copyleft/gpl.html.
+##
+## Other Usage
+## Alternatively, this file may be used in accordance with the terms and
+## conditions contained in a signed written agreement between you and Nokia.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+import bisect
+
+import numpy
+
+from formula import aggregate, compileFormula, criterionMask, precedents, toNumber
+
+
+class RecalcEngine(object):
+    """Keeps the computed values of a sheet full of formulas.
+
+    Every cell's formula is compiled once, cached until the cell is edited,
+    and entered in a dependency graph.
+    When a cell is edited only the cells downstream of it are recomputed,
+    in topological order, and cells that take part in a reference cycle
+    evaluate to None.  Subclasses say where the cells are stored.
+
+    The ranges formulas refer to are indexed by column and by the power of
+    two below their number of rows, each such list sorted by first row.  A
+    range holding a cell then starts no more than twice its class's length
+    above it, so finding the ranges that hold a cell only looks at those
+    that start close enough to it.
+    """
+
+    def __init__(self):
+        self.asts = {}
+        self.values = {}
+        self.dependents = {}
+        self.ranges = {}
+        self.rangeIndex = {}
+
+    def formula(self, cell):
+        """Return the text of cell and whether it may hold a formula."""
+        raise NotImplementedError
+
+    def hasCell(self, cell):
+        raise NotImplementedError
+
+    def rangeCells(self, cell, r1, c1, r2, c2):
+        """Return the cells of a range that cell must be computed after."""
+        raise NotImplementedError
+
+    def rangeArrays(self, cell, r1, c1, r2, c2, withStrings=False):
+        """Return the values of a range, leaving out cell itself.
+
+        The result is an array of numbers, a mask of which of them are
+        really numbers and, if withStrings is set, an object array of the
+        strings or None if there are none, all in column by column order.
+        """
+        raise NotImplementedError
+
+    def store(self, cell, value):
+        self.values[cell] = value
+
+    def value(self, row, col):
+        cell = (row, col)
+        if cell not in self.values:
+            self.evaluate(cell)
+        return self.values[cell]
+
+    def ast(self, cell):
+        ast = self.asts.get(cell)
+        if ast is None:
+            ast = self.parse(cell)
+            self.link(cell, ast)
+        return ast
+
+    def parse(self, cell):
+        formula, isFormula = self.formula(cell)
+        if isFormula:
+            return compileFormula(formula)
+        return ('text', formula)
+
+    def link(self, cell, ast):
+        self.asts[cell] = ast
+        cells, ranges = precedents(ast)
+        for precedent in cells:
+            self.dependents.setdefault(precedent, set()).add(cell)
+        if ranges:
+            self.ranges[cell] = ranges
+            for r1, c1, r2, c2 in ranges:
+                for col, lengthClass in self.rangeKeys(r1, c1, r2, c2):
+                    bisect.insort(self.rangeIndex.setdefault(col, {})
+                            .setdefault(lengthClass, []), (r1, r2, cell))
+
+    def unlink(self, cell):
+        ast = self.asts.pop(cell, None)
+        if ast is None:
+            return
+        for precedent in precedents(ast)[0]:
+            dependents = self.dependents.get(precedent)
+            if dependents is not None:
+                dependents.discard(cell)
+                if not dependents:
+                    del self.dependents[precedent]
+        for r1, c1, r2, c2 in self.ranges.pop(cell, ()):
+            for col, lengthClass in self.rangeKeys(r1, c1, r2, c2):
+                classes = self.rangeIndex[col]
+                entries = classes[lengthClass]
+                del entries[bisect.bisect_left(entries, (r1, r2, cell))]
+                if not entries:
+                    del classes[lengthClass]
+                    if not classes:
+                        del self.rangeIndex[col]
+
+    @staticmethod
+    def rangeKeys(r1, c1, r2, c2):
+        # The columns and length class a range is indexed under.
+        if r1 > r2:
+            return []
+        lengthClass = (r2 - r1 + 1).bit_length() - 1
+        return [(col, lengthClass) for col in range(c1, c2 + 1)]
+
+    def rangesHolding(self, row, col):
+        """Yield the cells whose formulas refer to a range holding a cell."""
+        for lengthClass, entries in self.rangeIndex.get(col, {}).items():
+            # Ranges of this class have fewer than 2 ** (lengthClass + 1)
+            # rows, so those that start any higher can't reach row.
+            first = bisect.bisect_left(entries,
+                    (row - (2 << lengthClass) + 2,))
+            last = bisect.bisect_left(entries, (row + 1,))
+            for i in range(first, last):
+                r1, r2, dependent = entries[i]
+                if r2 >= row:
+                    yield dependent
+
+    def reset(self):
+        self.asts.clear()
+        self.values.clear()
+        self.dependents.clear()
+        self.ranges.clear()
+        self.rangeIndex.clear()
+
+    def precedentCells(self, cell):
+        cells, ranges = precedents(self.ast(cell))
+        for r1, c1, r2, c2 in ranges:
+            for precedent in self.rangeCells(cell, r1, c1, r2, c2):
+                yield precedent
+        for precedent in cells:
+            if self.hasCell(precedent):
+                yield precedent
+
+    def downstream(self, cell):
+        dirty = set([cell])
+        pending = [cell]
+        while pending:
+            row, col = pending.pop()
+            found = set(self.dependents.get((row, col), ()))
+            found.update(self.rangesHolding(row, col))
+            found -= dirty
+            dirty |= found
+            pending.extend(found)
+        return dirty
+
+    def evaluate(self, cell):
+        # A depth first walk of the cells that still need a value, so that
+        # every cell is computed after its precedents.  A precedent found on
+        # the current path closes a cycle, all of whose cells become None.
+        path = [cell]
+        onPath = set(path)
+        walks = [self.precedentCells(cell)]
+        cyclic = set()
+        while path:
+            for precedent in walks[-1]:
+                if precedent in self.values:
+                    continue
+                if precedent in onPath:
+                    cyclic.update(path[path.index(precedent):])
+                    continue
+                path.append(precedent)
+                onPath.add(precedent)
+                walks.append(self.precedentCells(precedent))
+                break
+            else:
+                done = path.pop()
+                onPath.discard(done)
+                walks.pop()
+                if done in cyclic:
+                    self.store(done, None)
+                else:
+                    self.store(done, self.compute(done))
+
+    def compute(self, cell):
+        return self.computeNode(cell, self.ast(cell))
+
+    def computeNode(self, cell, node):
+        kind = node[0]
+        if kind in ('text', 'num', 'str'):
+            return node[1]
+        if kind == 'ref':
+            if not self.hasCell(node[1]):
+                return None
+            return self.value(*node[1])
+        if kind == 'neg':
+            return -(toNumber(self.computeNode(cell, node[1])) or 0)
+        if kind == 'binop':
+            firstVal = toNumber(self.computeNode(cell, node[2])) or 0
+            secondVal = toNumber(self.computeNode(cell, node[3])) or 0
+            op = node[1]
+            if op == '+':
+                return firstVal + secondVal
+            if op == '-':
+                return firstVal - secondVal
+            if op == '*':
+                return firstVal * secondVal
+            if secondVal == 0:
+                return "nan"
+            return firstVal / secondVal
+        name, args = node[1:]
+        if name == 'SUMIF':
+            return self.sumIf(cell, *args)
+        numbers = []
+        for arg in args:
+            if arg[0] == 'range':
+                values, numeric, strings = self.rangeArrays(cell, *arg[1:])
+                numbers.append(values[numeric])
+            else:
+                number = toNumber(self.computeNode(cell, arg))
+                if number is not None:
+                    numbers.append(numpy.array([number]))
+        if numbers:
+            numbers = numpy.concatenate(numbers)
+        else:
+            numbers = numpy.zeros(0, numpy.int64)
+        return aggregate(name, numbers)
+
+    def sumIf(self, cell, testRange, criterion, sumRange=None):
+        if testRange[0] != 'range':
+            return 0
+        values, numeric, strings = self.rangeArrays(cell, *testRange[1:],
+                withStrings=True)
+        mask = criterionMask(self.computeNode(cell, criterion), values,
+                numeric, strings)
+        if sumRange is not None and sumRange[0] == 'range':
+            values, numeric, strings = self.rangeArrays(cell, *sumRange[1:])
+            size = min(len(mask), len(values))
+            mask = mask[:size]
+            values = values[:size]
+            numeric = numeric[:size]
+        return values[mask & numeric].sum().item()
+
+    def cellChanged(self, cell):
+        """Recompute what depends on cell, returning the cells that changed."""
+        # Font and colour changes of a table arrive here too, skip them.
+        ast = self.asts.get(cell)
+        if ast is not None and ast == self.parse(cell):
+            return set()
+        self.unlink(cell)
+        dirty = self.downstream(cell)
+        for dirtyCell in dirty:
+            self.values.pop(dirtyCell, None)
+        for dirtyCell in dirty:
+            if dirtyCell not in self.values:
+                self.evaluate(dirtyCell)
+        return dirty
+
+
+class TableRecalcEngine(RecalcEngine):
+    """The RecalcEngine of a QTableWidget of SpreadSheetItems."""
+
+    def __init__(self, table):
+        super(TableRecalcEngine, self).__init__()
+
+        self.table = table
+        table.model().dataChanged.connect(self.cellsChanged)
+
+    def formula(self, cell):
+        item = self.table.item(*cell)
+        if item is None:
+            return None, False
+        formula = getattr(item, 'formula', None)
+        if formula is None:
+            return item.text(), False
+        return formula(), True
+
+    def hasCell(self, cell):
+        return self.table.item(*cell) is not None
+
+    def rangeCells(self, cell, r1, c1, r2, c2):
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                if (r, c) != cell and self.table.item(r, c) is not None:
+                    yield (r, c)
+
+    def rangeArrays(self, cell, r1, c1, r2, c2, withStrings=False):
+        values = []
+        strings = []
+        for c in range(c1, c2 + 1):
+            for r in range(r1, r2 + 1):
+                if (r, c) != cell and self.table.item(r, c) is not None:
+                    value = self.value(r, c)
+                    values.append(value)
+                    strings.append(value if isinstance(value, str) else None)
+                else:
+                    values.append(None)
+                    strings.append(None)
+        numbers = [toNumber(value) for value in values]
+        numeric = numpy.array([number is not None for number in numbers], bool)
+        numbers = numpy.array([number or 0 for number in numbers])
+        if not len(numbers):
+            numbers = numpy.zeros(0, numpy.int64)
+        if not withStrings:
+            return numbers, numeric, None
+        return numbers, numeric, numpy.array(strings, object)
+
+    def cellsChanged(self, topLeft, bottomRight):
+        changed = False
+        for row in range(topLeft.row(), bottomRight.row() + 1):
+            for col in range(topLeft.column(), bottomRight.column() + 1):
+                if self.cellChanged((row, col)):
+                    changed = True
+        if changed:
+            self.table.viewport().update()
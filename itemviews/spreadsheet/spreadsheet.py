@@ -44,16 +44,20 @@ from PyQt5.QtCore import QDate, QPoint, Qt
 from PyQt5.QtGui import QColor, QIcon, QKeySequence, QPainter, QPixmap
 from PyQt5.QtWidgets import (QAction, QActionGroup, QApplication, QColorDialog,
         QComboBox, QDialog, QFontDialog, QGroupBox, QHBoxLayout, QLabel,
-        QLineEdit, QMainWindow, QMessageBox, QPushButton, QTableWidget,
-        QTableWidgetItem, QToolBar, QVBoxLayout)
+        QFileDialog, QLineEdit, QMainWindow, QMessageBox, QProgressBar,
+        QPushButton, QTableView, QTableWidget, QTableWidgetItem, QToolBar,
+        QVBoxLayout)
 from PyQt5.QtPrintSupport import QPrinter, QPrintPreviewDialog
 
 import spreadsheet_rc
 
+from csvstream import CsvExporter, CsvImporter
 from spreadsheetdelegate import SpreadSheetDelegate
 from spreadsheetitem import SpreadSheetItem
+from spreadsheetmodel import SpreadSheetModel
 from printview import PrintView
-from util import decode_pos, encode_pos
+from recalcengine import TableRecalcEngine
+from util import decode_pos, encode_column, encode_pos
 
 
 class SpreadSheet(QMainWindow):
@@ -74,9 +78,9 @@ class SpreadSheet(QMainWindow):
         self.toolBar.addWidget(self.formulaInput)
         self.table = QTableWidget(rows, cols, self)
         for c in range(cols):
-            character = chr(ord('A') + c)
-            self.table.setHorizontalHeaderItem(c, QTableWidgetItem(character))
+            self.table.setHorizontalHeaderItem(c, QTableWidgetItem(encode_column(c)))
 
+        self.table.recalcEngine = TableRecalcEngine(self.table)
         self.table.setItemPrototype(self.table.item(rows - 1, cols - 1))
         self.table.setItemDelegate(SpreadSheetDelegate(self))
         self.createActions()
@@ -252,7 +256,7 @@ class SpreadSheet(QMainWindow):
         for r in range(self.table.rowCount()):
             rows.append(str(r + 1))
         for c in range(self.table.columnCount()):
-            cols.append(chr(ord('A') + c))
+            cols.append(encode_column(c))
         addDialog = QDialog(self)
         addDialog.setWindowTitle(title)
         group = QGroupBox(title, addDialog)
@@ -519,6 +523,9 @@ class SpreadSheet(QMainWindow):
             <li>Multiplying two cells.</li>
             <li>Dividing one cell with another.</li>
             <li>Summing the contents of an arbitrary number of cells.</li>
+            <li>Formulas starting with "=" such as
+             <c>=SUMIF(D2:D9, "NOK", F2:F9) / COUNT(C2:C9)</c>, using
+             SUM, AVG, MIN, MAX, COUNT and SUMIF over ranges.</li>
             </HTML>
         """)
 
@@ -531,12 +538,167 @@ class SpreadSheet(QMainWindow):
         dlg.exec_()
 
 
+class LargeSpreadSheet(QMainWindow):
+    """A sheet too large for QTableWidget, viewed through a SpreadSheetModel."""
+
+    currentDateFormat = SpreadSheet.dateFormats[0]
+
+    fileFilter = "CSV files (*.csv *.tsv);;All files (*)"
+
+    def __init__(self, model, parent = None):
+        super(LargeSpreadSheet, self).__init__(parent)
+
+        self.stream = None
+        self.encoding = 'utf-8-sig'
+        self.table = QTableView(self)
+        self.table.setModel(model)
+        self.table.setItemDelegate(SpreadSheetDelegate(self))
+
+        self.importAction = QAction("&Import...", self)
+        self.importAction.setShortcut(QKeySequence.Open)
+        self.importAction.triggered.connect(self.importFile)
+
+        self.exportAction = QAction("&Export Values...", self)
+        self.exportAction.triggered.connect(self.exportValues)
+
+        self.exportFormulasAction = QAction("Export &Formulas...", self)
+        self.exportFormulasAction.triggered.connect(self.exportFormulas)
+
+        self.printAction = QAction("&Print", self)
+        self.printAction.setShortcut(QKeySequence.Print)
+        self.printAction.triggered.connect(self.print_)
+
+        self.exitAction = QAction("E&xit", self)
+        self.exitAction.setShortcut(QKeySequence.Quit)
+        self.exitAction.triggered.connect(QApplication.instance().quit)
+
+        self.fileMenu = self.menuBar().addMenu("&File")
+        self.fileMenu.addAction(self.importAction)
+        self.fileMenu.addAction(self.exportAction)
+        self.fileMenu.addAction(self.exportFormulasAction)
+        self.fileMenu.addAction(self.printAction)
+        self.fileMenu.addAction(self.exitAction)
+
+        self.progressBar = QProgressBar()
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.hide()
+        self.statusBar().addPermanentWidget(self.progressBar)
+
+        self.setCentralWidget(self.table)
+        self.setWindowTitle("Spreadsheet")
+
+    def importFile(self, path=None):
+        if not path:
+            path, _ = QFileDialog.getOpenFileName(self, "Import", "",
+                    self.fileFilter)
+            if not path:
+                return
+        model = SpreadSheetModel(0, 0, self)
+        self.table.setModel(model)
+        self.startStream(CsvImporter(model, path, encoding=self.encoding,
+                parent=self))
+
+    def exportValues(self):
+        self.exportFile(False)
+
+    def exportFormulas(self):
+        self.exportFile(True)
+
+    def exportFile(self, formulas):
+        path, _ = QFileDialog.getSaveFileName(self, "Export", "",
+                self.fileFilter)
+        if path:
+            self.startStream(CsvExporter(self.table.model(), path, formulas,
+                    parent=self))
+
+    def startStream(self, stream):
+        if self.stream is not None:
+            self.stream.cancel()
+        self.stream = stream
+        stream.progress.connect(self.updateProgress)
+        stream.finished.connect(self.streamFinished)
+        stream.failed.connect(self.streamFailed)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        try:
+            stream.start()
+        except (IOError, OSError) as e:
+            self.stream = None
+            self.progressBar.hide()
+            QMessageBox.warning(self, "Spreadsheet", str(e))
+
+    def updateProgress(self, done, total):
+        self.progressBar.setValue(100 * done // total if total else 100)
+
+    def streamFinished(self):
+        self.stream = None
+        self.progressBar.hide()
+        self.statusBar().showMessage("%d rows" % self.table.model().rowCount(),
+                2000)
+
+    def streamFailed(self, message):
+        self.stream = None
+        self.progressBar.hide()
+        QMessageBox.warning(self, "Spreadsheet", message)
+
+    def print_(self):
+        printer = QPrinter(QPrinter.ScreenResolution)
+        dlg = QPrintPreviewDialog(printer)
+        view = PrintView()
+        view.setModel(self.table.model())
+        dlg.paintRequested.connect(view.print_)
+        dlg.exec_()
+
 if __name__ == '__main__':
 
+    import codecs
     import sys
 
+    import numpy
+
+    from PyQt5.QtCore import QCommandLineOption, QCommandLineParser
+
     app = QApplication(sys.argv)
-    sheet = SpreadSheet(10, 6)
+
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Spreadsheet Example")
+    parser.addHelpOption()
+    rowsOption = QCommandLineOption(['r', 'rows'],
+            "Show a sheet of <count> rows of random numbers.", 'count')
+    parser.addOption(rowsOption)
+    columnsOption = QCommandLineOption(['c', 'columns'],
+            "The number of columns of the random sheet.", 'count', '10')
+    parser.addOption(columnsOption)
+    encodingOption = QCommandLineOption(['e', 'encoding'],
+            "The <encoding> of the files to import.", 'encoding', 'utf-8-sig')
+    parser.addOption(encodingOption)
+    parser.addPositionalArgument('file', "A CSV or TSV file to open.")
+    parser.process(app)
+
+    try:
+        codecs.lookup(parser.value(encodingOption))
+    except LookupError:
+        parser.showHelp(1)
+
+    if parser.positionalArguments():
+        sheet = LargeSpreadSheet(SpreadSheetModel(0, 0))
+        sheet.encoding = parser.value(encodingOption)
+        sheet.importFile(parser.positionalArguments()[0])
+    elif parser.isSet(rowsOption):
+        try:
+            rows = max(2, int(parser.value(rowsOption)))
+            columns = max(1, int(parser.value(columnsOption)))
+        except ValueError:
+            parser.showHelp(1)
+
+        model = SpreadSheetModel(rows, columns)
+        for c in range(columns):
+            model.setColumn(c, numpy.random.randint(-1000, 1000, rows))
+            model.setCell(rows - 1, c, "sum %s %s" % (encode_pos(0, c),
+                    encode_pos(rows - 2, c)))
+        sheet = LargeSpreadSheet(model)
+    else:
+        sheet = SpreadSheet(10, 6)
     sheet.setWindowIcon(QIcon(QPixmap(":/images/interview.png")))
     sheet.resize(640, 420)
     sheet.show()
@@ -40,9 +40,14 @@
 from PyQt5.QtCore import QDate, Qt
 from PyQt5.QtWidgets import QCompleter, QDateTimeEdit, QItemDelegate, QLineEdit
 
+from spreadsheetmodel import SpreadSheetModel
+
 
 class SpreadSheetDelegate(QItemDelegate):
 
+    # the most strings of a large sheet's column offered for completion
+    MaxCompletions = 1000
+
     def __init__(self, parent = None):
         super(SpreadSheetDelegate, self).__init__(parent)
 
@@ -54,14 +59,18 @@ class SpreadSheetDelegate(QItemDelegate):
             return editor
 
         editor = QLineEdit(parent)
-        # create a completer with the strings in the column as model
-        allStrings = []
-        for i in range(1, index.model().rowCount()):
-            strItem = index.model().data(index.sibling(i, index.column()), Qt.EditRole)
-            if strItem not in allStrings:
-                allStrings.append(strItem)
-
-        autoComplete = QCompleter(allStrings)
+        model = index.model()
+        if isinstance(model, SpreadSheetModel):
+            # Completing straight from a large model would look at every row
+            # on each key press, so take a sorted sample of its strings.
+            autoComplete = QCompleter(model.columnStrings(index.column(),
+                    self.MaxCompletions), editor)
+            autoComplete.setModelSorting(QCompleter.CaseSensitivelySortedModel)
+        else:
+            # complete with the strings in the column, straight from the model
+            autoComplete = QCompleter(model, editor)
+            autoComplete.setCompletionColumn(index.column())
+            autoComplete.setCompletionRole(Qt.EditRole)
         editor.setCompleter(autoComplete)
         editor.editingFinished.connect(self.commitAndCloseEditor)
         return editor
@@ -0,0 +1,434 @@
+#############################################################################
+##
+## Copyright (C) 2012 Hans-Peter Jansen <hpj@urpla.net>.
+## Copyright (C) 2011 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+## Contact: Nokia Corporation (qt-info@nokia.com)
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## GNU Lesser General Public License Usage
+## This file may be used under the terms of the GNU Lesser General Public
+## License version 2.1 as published by the Free Software Foundation and
+## appearing in the file LICENSE.LGPL included in the packaging of this
+## file. Please review the following information to ensure the GNU Lesser
+## General Public License version 2.1 requirements will be met:
+## http:#www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights. These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU General
+## Public License version 3.0 as published by the Free Software Foundation
+## and appearing in the file LICENSE.GPL included in the packaging of this
+## file. Please review the following information to ensure the GNU General
+## Public License version 3.0 requirements will be met:
+## http:#www.gnu.org/copyleft/gpl.html.
+##
+## Other Usage
+## Alternatively, this file may be used in accordance with the terms and
+## conditions contained in a signed written agreement between you and Nokia.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+
+import bisect
+import itertools
+import math
+
+import numpy
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QColor
+
+from formula import compileFormula
+from recalcengine import RecalcEngine
+from util import encode_column
+
+FORMULA_LEADS = ('=', '+', '-', '*', '/', 's', 'S')
+
+NUMBER_LEADS = tuple('0123456789+-.')
+
+
+def parseValue(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        value = float(text)
+    except ValueError:
+        return text
+    if math.isinf(value) or math.isnan(value):
+        return text
+    return value
+
+
+class ColumnRecalcEngine(RecalcEngine):
+    """The RecalcEngine of a SpreadSheetModel.
+
+    Computed formula values are written back to the model's columns, so
+    the values of a range are slices of the column arrays whatever the range
+    holds.
+    """
+
+    def __init__(self, model):
+        super(ColumnRecalcEngine, self).__init__()
+
+        self.model = model
+
+    def formula(self, cell):
+        return self.model.formulas.get(cell), True
+
+    def parse(self, cell):
+        if cell in self.model.formulas:
+            return super(ColumnRecalcEngine, self).parse(cell)
+        if not self.model.isFilled(*cell):
+            return ('text', None)
+        return ('text', self.model.value(*cell))
+
+    def hasCell(self, cell):
+        return self.model.isFilled(*cell)
+
+    def rangeCells(self, cell, r1, c1, r2, c2):
+        cells = []
+        for col, rows in self.model.formulaRows.items():
+            if c1 <= col <= c2:
+                first = bisect.bisect_left(rows, r1)
+                last = bisect.bisect_right(rows, r2)
+                cells.extend((row, col) for row in rows[first:last]
+                        if (row, col) != cell)
+        return cells
+
+    def rangeArrays(self, cell, r1, c1, r2, c2, withStrings=False):
+        model = self.model
+        r1 = max(r1, 0)
+        c1 = max(c1, 0)
+        r2 = min(r2, model.rows - 1)
+        c2 = min(c2, len(model.numbers) - 1)
+        if r1 > r2 or c1 > c2:
+            return (numpy.zeros(0, numpy.int64), numpy.zeros(0, bool), None)
+        columns = range(c1, c2 + 1)
+        numbers = numpy.concatenate([model.numbers[c][r1:r2 + 1]
+                for c in columns])
+        numeric = numpy.concatenate([model.filled[c][r1:r2 + 1]
+                for c in columns])
+        strings = None
+        hasStrings = [model.strings[c] is not None for c in columns]
+        if any(hasStrings):
+            numeric &= ~numpy.concatenate([model.isString[c][r1:r2 + 1]
+                    if hasString else numpy.zeros(r2 + 1 - r1, bool)
+                    for c, hasString in zip(columns, hasStrings)])
+            if withStrings:
+                strings = numpy.concatenate([model.strings[c][r1:r2 + 1]
+                        if hasString else numpy.empty(r2 + 1 - r1, object)
+                        for c, hasString in zip(columns, hasStrings)])
+        row, col = cell
+        if r1 <= row <= r2 and c1 <= col <= c2:
+            i = (col - c1) * (r2 + 1 - r1) + row - r1
+            numeric[i] = False
+            if strings is not None:
+                strings[i] = None
+        return numbers, numeric, strings
+
+    def store(self, cell, value):
+        super(ColumnRecalcEngine, self).store(cell, value)
+        if cell in self.model.formulas:
+            self.model.storeValue(cell[0], cell[1], value, True)
+
+
+class SpreadSheetModel(QAbstractTableModel):
+    """A table model that keeps a sheet's values column by column.
+
+    Each column is an int64 array, promoted to float64 once it holds a
+    fraction, with an object array for strings that is only allocated when
+    the column holds one, along with a mask of its strings.  Formulas live
+    in a dictionary keyed by cell, with the sorted rows of the formulas of
+    each column, and their results are stored in the columns like any other
+    value.  The arrays grow geometrically, so rows can be appended in
+    batches.
+    """
+
+    def __init__(self, rows, columns, parent=None):
+        super(SpreadSheetModel, self).__init__(parent)
+
+        self.rows = rows
+        self.capacity = rows
+        self.numbers = [numpy.zeros(rows, numpy.int64) for c in range(columns)]
+        self.strings = [None] * columns
+        self.isString = [None] * columns
+        self.filled = [numpy.zeros(rows, bool) for c in range(columns)]
+        self.formulas = {}
+        self.formulaRows = {}
+        self.engine = ColumnRecalcEngine(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.numbers)
+
+    def isFilled(self, row, col):
+        return (0 <= row < self.rows and 0 <= col < len(self.numbers) and
+                bool(self.filled[col][row]))
+
+    def value(self, row, col):
+        if (row, col) in self.formulas:
+            return self.engine.value(row, col)
+        if not self.filled[col][row]:
+            return None
+        strings = self.strings[col]
+        if strings is not None and strings[row] is not None:
+            return strings[row]
+        value = self.numbers[col][row].item()
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def text(self, row, col):
+        if not self.isFilled(row, col):
+            return None
+        value = self.value(row, col)
+        if value is None:
+            return None
+        return str(value)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        col = index.column()
+        if role in (Qt.EditRole, Qt.StatusTipRole):
+            formula = self.formulas.get((row, col))
+            if formula is not None:
+                return formula
+            return self.text(row, col)
+        if role == Qt.DisplayRole:
+            return self.value(row, col)
+        if role == Qt.TextColorRole:
+            value = self.value(row, col)
+            if not isinstance(value, int):
+                return QColor(Qt.black)
+            elif value < 0:
+                return QColor(Qt.red)
+            return QColor(Qt.blue)
+        if role == Qt.TextAlignmentRole:
+            t = self.text(row, col)
+            if t and (t[0].isdigit() or t[0] == '-'):
+                return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return encode_column(section)
+        return section + 1
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self.setCell(index.row(), index.column(), value)
+        return True
+
+    def setCell(self, row, col, text):
+        if text and compileFormula(text)[0] != 'text':
+            if (row, col) not in self.formulas:
+                bisect.insort(self.formulaRows.setdefault(col, []), row)
+            self.formulas[(row, col)] = text
+            self.filled[col][row] = True
+        else:
+            if self.formulas.pop((row, col), None) is not None:
+                rows = self.formulaRows[col]
+                del rows[bisect.bisect_left(rows, row)]
+                if not rows:
+                    del self.formulaRows[col]
+            self.storeValue(row, col, parseValue(text) if text else None)
+        dirty = self.engine.cellChanged((row, col))
+        dirty.add((row, col))
+        rows = [cell[0] for cell in dirty]
+        cols = [cell[1] for cell in dirty]
+        self.dataChanged.emit(self.index(min(rows), min(cols)),
+                self.index(max(rows), max(cols)))
+
+    def setColumn(self, col, values):
+        """Fill a whole column from a sequence of numbers at once."""
+        values = numpy.asarray(values)
+        if values.dtype.kind in 'biu':
+            numbers = numpy.zeros(self.capacity, numpy.int64)
+        else:
+            numbers = numpy.zeros(self.capacity, numpy.float64)
+        numbers[:self.rows] = values
+        self.numbers[col] = numbers
+        self.strings[col] = None
+        self.isString[col] = None
+        self.filled[col][:self.rows] = True
+        for row in self.formulaRows.pop(col, []):
+            del self.formulas[(row, col)]
+        self.engine.reset()
+        self.dataChanged.emit(self.index(0, col), self.index(self.rows - 1, col))
+
+    def storeValue(self, row, col, value, isFormula=False):
+        numbers = self.numbers[col]
+        strings = self.strings[col]
+        if strings is not None:
+            strings[row] = None
+            self.isString[col][row] = False
+        if not isFormula:
+            self.filled[col][row] = value is not None
+        if isinstance(value, int) and numbers.dtype == numpy.int64:
+            if -2 ** 63 <= value < 2 ** 63:
+                numbers[row] = value
+                return
+            value = float(value)
+        if isinstance(value, (int, float)):
+            if numbers.dtype != numpy.float64:
+                numbers = self.numbers[col] = numbers.astype(numpy.float64)
+            numbers[row] = value
+            return
+        numbers[row] = 0
+        if value is not None:
+            if strings is None:
+                strings = self.strings[col] = numpy.empty(self.capacity, object)
+                self.isString[col] = numpy.zeros(self.capacity, bool)
+            strings[row] = value
+            self.isString[col][row] = True
+
+    def reserve(self, rows):
+        if rows <= self.capacity:
+            return
+        self.capacity = max(rows, 2 * self.capacity)
+        for col in range(len(self.numbers)):
+            self.numbers[col] = self.grown(self.numbers[col])
+            self.filled[col] = self.grown(self.filled[col])
+            if self.strings[col] is not None:
+                self.strings[col] = self.grown(self.strings[col])
+                self.isString[col] = self.grown(self.isString[col])
+
+    def grown(self, array):
+        grown = numpy.zeros(self.capacity, array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def appendColumns(self, count):
+        first = len(self.numbers)
+        self.beginInsertColumns(QModelIndex(), first, first + count - 1)
+        for c in range(count):
+            self.numbers.append(numpy.zeros(self.capacity, numpy.int64))
+            self.strings.append(None)
+            self.isString.append(None)
+            self.filled.append(numpy.zeros(self.capacity, bool))
+        self.endInsertColumns()
+
+    def appendRows(self, rows):
+        """Append a batch of rows, each a list of cell texts, at once."""
+        if not rows:
+            return
+        width = max(len(row) for row in rows)
+        if width > len(self.numbers):
+            self.appendColumns(width - len(self.numbers))
+        first = self.rows
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.reserve(first + len(rows))
+        columns = itertools.zip_longest(*rows, fillvalue='')
+        for col, texts in enumerate(columns):
+            self.storeColumn(col, first, texts)
+        self.rows += len(rows)
+        self.endInsertRows()
+        if self.formulas:
+            self.engine.reset()
+            self.dataChanged.emit(self.index(0, 0),
+                    self.index(first - 1, len(self.numbers) - 1))
+
+    def storeColumn(self, col, first, texts):
+        # Sort a batch of texts into empty cells, strings, numbers and
+        # formulas by their first character using array operations.  Only
+        # possible formulas are looked at one cell at a time.
+        texts = numpy.array(texts)
+        last = first + len(texts)
+        leading = texts.astype('U1')
+        self.filled[col][first:last] = texts != ''
+        self.numbers[col][first:last] = 0
+        if self.strings[col] is not None:
+            self.strings[col][first:last] = None
+            self.isString[col][first:last] = False
+        for i in numpy.flatnonzero(numpy.isin(leading, FORMULA_LEADS)).tolist():
+            text = str(texts[i])
+            if compileFormula(text)[0] != 'text':
+                self.formulas[(first + i, col)] = text
+                # the rows are appended after any others, so stay in order
+                self.formulaRows.setdefault(col, []).append(first + i)
+                leading[i] = ''
+        numeric = numpy.isin(leading, NUMBER_LEADS)
+        if numeric.any():
+            self.storeNumbers(col, first + numpy.flatnonzero(numeric),
+                    texts[numeric])
+        strings = (leading != '') & ~numeric
+        if strings.any():
+            if self.strings[col] is None:
+                self.strings[col] = numpy.empty(self.capacity, object)
+                self.isString[col] = numpy.zeros(self.capacity, bool)
+            rows = first + numpy.flatnonzero(strings)
+            self.strings[col][rows] = texts[strings].astype(object)
+            self.isString[col][rows] = True
+
+    def storeNumbers(self, col, rows, texts):
+        try:
+            values = texts.astype(numpy.int64)
+        except (ValueError, OverflowError):
+            try:
+                values = texts.astype(numpy.float64)
+            except ValueError:
+                values = None
+            else:
+                if not numpy.isfinite(values).all():
+                    values = None
+        if values is None:
+            for row, text in zip(rows.tolist(), texts.tolist()):
+                self.storeValue(row, col, parseValue(text))
+            return
+        if values.dtype != self.numbers[col].dtype:
+            self.numbers[col] = self.numbers[col].astype(numpy.float64)
+        self.numbers[col][rows] = values
+
+    def columnStrings(self, col, limit):
+        """Return up to limit of the different strings of a column, sorted."""
+        strings = self.strings[col]
+        if strings is None:
+            return []
+        strings = strings[:self.rows][self.isString[col][:self.rows]]
+        unique = dict.fromkeys(strings.tolist())
+        return sorted(itertools.islice(unique, limit))
+
+    def columnTexts(self, col, first, last):
+        """Return the texts of a column's plain values between two rows.
+
+        Formula cells hold whatever their last computed value was.
+        """
+        numbers = self.numbers[col][first:last]
+        if numbers.dtype == numpy.float64:
+            texts = [str(int(x)) if x.is_integer() else str(x)
+                    for x in numbers.tolist()]
+        else:
+            texts = numbers.astype(str).tolist()
+        for i in numpy.flatnonzero(~self.filled[col][first:last]).tolist():
+            texts[i] = ''
+        if self.strings[col] is not None:
+            strings = self.strings[col]
+            for i in numpy.flatnonzero(self.isString[col][first:last]).tolist():
+                texts[i] = strings[first + i]
+        return texts
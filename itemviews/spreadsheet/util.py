@@ -36,10 +36,31 @@
 #############################################################################
 
 
+def decode_column(name):
+    if not name or not name.isalpha():
+        raise ValueError(name)
+    col = 0
+    for letter in name.upper():
+        if not 'A' <= letter <= 'Z':
+            raise ValueError(name)
+        col = col * 26 + ord(letter) - ord('A') + 1
+    return col - 1
+
+
+def encode_column(col):
+    name = ''
+    col += 1
+    while col > 0:
+        col, letter = divmod(col - 1, 26)
+        name = chr(letter + ord('A')) + name
+    return name
+
+
 def decode_pos(pos):
+    letters = pos.rstrip('0123456789')
     try:
-        row = int(pos[1:]) - 1
-        col = ord(pos[0]) - ord('A')
+        row = int(pos[len(letters):]) - 1
+        col = decode_column(letters)
     except ValueError:
         row = -1
         col = -1
@@ -48,4 +69,4 @@ def decode_pos(pos):
 
 
 def encode_pos(row, col):
-    return chr(col + ord('A')) + str(row + 1)
+    return encode_column(col) + str(row + 1)
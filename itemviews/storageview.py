@@ -53,8 +53,12 @@
 
 
 import math
+import os
 
-from PyQt5.QtCore import QAbstractTableModel, QByteArray, QDir, QStorageInfo, Qt
+from PyQt5.QtCore import (pyqtSignal, QAbstractTableModel, QByteArray,
+        QCommandLineOption, QCommandLineParser, QDir, QMutex, QStorageInfo,
+        Qt, QThread, QTimer, QWaitCondition)
+from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QAbstractItemView, QApplication, QTreeView
 
 
@@ -76,6 +80,62 @@ def sizeToString(size):
     return "%0.*f %s" % (decimals, normsize, unit)
 
 
+class StorageRefresher(QThread):
+    """Samples the mounted volumes every interval milliseconds.
+
+    Each sample is sent as a list with a snapshot of every volume, a tuple
+    of the values of the model's columns, so that nothing in the GUI thread
+    ever has to query a volume itself.
+    """
+
+    # The refreshers that were stopped while stuck on a volume, which are
+    # kept until they finish as a running QThread mustn't be destroyed.
+    detached = set()
+
+    sampleStarted = pyqtSignal()
+    volumesSampled = pyqtSignal(list)
+
+    def __init__(self, interval=5000, parent=None):
+        super(StorageRefresher, self).__init__(parent)
+
+        self.mutex = QMutex()
+        self.condition = QWaitCondition()
+        self.interval = interval
+        self.abort = False
+
+    def stop(self):
+        self.mutex.lock()
+        self.abort = True
+        self.condition.wakeOne()
+        self.mutex.unlock()
+
+    def detach(self):
+        self.setParent(None)
+        StorageRefresher.detached.add(self)
+        self.finished.connect(self.release)
+
+    def release(self):
+        StorageRefresher.detached.discard(self)
+        self.deleteLater()
+
+    def run(self):
+        while True:
+            self.sampleStarted.emit()
+            snapshots = [StorageModel.snapshot(volume)
+                    for volume in QStorageInfo.mountedVolumes()]
+            if self.abort:
+                return
+            self.volumesSampled.emit(snapshots)
+
+            self.mutex.lock()
+            if not self.abort:
+                self.condition.wait(self.mutex, self.interval)
+            abort = self.abort
+            self.mutex.unlock()
+            if abort:
+                return
+
+
 class StorageModel(QAbstractTableModel):
     ColumnRootPath, ColumnName, ColumnDevice, ColumnFileSystemName, \
     ColumnTotal, ColumnFree, ColumnAvailable, ColumnIsReady, \
@@ -107,9 +167,76 @@ class StorageModel(QAbstractTableModel):
         ColumnIsValid: "Valid",
     }
 
-    def __init__(self, parent = None):
+    # Each volume is identified by its root path.
+    keyColumn = ColumnRootPath
+
+    def __init__(self, parent = None, interval = 5000, timeout = 2000):
         super(StorageModel, self).__init__(parent)
-        self.volumes = QStorageInfo.mountedVolumes()
+        self.snapshots = []
+
+        # Whether a sample has taken longer than timeout milliseconds, most
+        # likely because a mount has stopped responding.  The volumes are
+        # then shown as they last were, greyed out.
+        self.stalled = False
+        self.watchdog = QTimer(self)
+        self.watchdog.setSingleShot(True)
+        self.watchdog.setInterval(timeout)
+        self.watchdog.timeout.connect(self.sampleStalled)
+
+        self.refresher = StorageRefresher(interval, self)
+        self.refresher.sampleStarted.connect(self.watchdog.start)
+        self.refresher.volumesSampled.connect(self.setSnapshots)
+        self.refresher.start()
+
+    @classmethod
+    def snapshot(cls, volume):
+        values = []
+        for column in range(cls.ColumnCount):
+            value = cls.columnFuncMap[column](volume)
+            if isinstance(value, QByteArray):
+                value = str(bytes(value).decode('utf-8'))
+            values.append(value)
+        return tuple(values)
+
+    def stopRefreshing(self, timeout = 1000):
+        self.watchdog.stop()
+        self.refresher.stop()
+        if not self.refresher.wait(timeout):
+            # It is stuck on a volume that isn't responding, so let it finish
+            # on its own.
+            self.refresher.sampleStarted.disconnect(self.watchdog.start)
+            self.refresher.volumesSampled.disconnect(self.setSnapshots)
+            self.refresher.detach()
+
+    def setSnapshots(self, snapshots):
+        self.watchdog.stop()
+        wasStalled = self.stalled
+        self.stalled = False
+
+        key = self.keyColumn
+        if [old[key] for old in self.snapshots] != \
+                [new[key] for new in snapshots]:
+            self.beginResetModel()
+            self.snapshots = snapshots
+            self.endResetModel()
+            return
+
+        old, self.snapshots = self.snapshots, snapshots
+        for row, (before, after) in enumerate(zip(old, snapshots)):
+            if wasStalled:
+                self.dataChanged.emit(self.index(row, 0),
+                        self.index(row, self.ColumnCount - 1))
+                continue
+            for column in range(self.ColumnCount):
+                if before[column] != after[column]:
+                    index = self.index(row, column)
+                    self.dataChanged.emit(index, index)
+
+    def sampleStalled(self):
+        self.stalled = True
+        if self.snapshots:
+            self.dataChanged.emit(self.index(0, 0),
+                    self.index(len(self.snapshots) - 1, self.ColumnCount - 1))
 
     def columnCount(self, parent = None):
         return self.ColumnCount
@@ -117,28 +244,28 @@ class StorageModel(QAbstractTableModel):
     def rowCount(self, parent):
         if parent.isValid():
             return 0
-        return len(self.volumes)
+        return len(self.snapshots)
 
     def data(self, index, role):
         if not index.isValid():
             return None
         if role == Qt.DisplayRole:
-            volume = self.volumes[index.row()]
-            func = self.columnFuncMap.get(index.column())
-            if func is not None:
-                return func(volume)
+            return self.snapshots[index.row()][index.column()]
 
         elif role == Qt.ToolTipRole:
-            volume = self.volumes[index.row()]
+            snapshot = self.snapshots[index.row()]
             tooltip = []
             for column in range(self.ColumnCount):
                 label = self.columnNameMap.get(column)
-                value = self.columnFuncMap[column](volume)
-                if isinstance(value, QByteArray):
-                    value = str(bytes(value).decode('utf-8'))
-                tooltip.append("{0}: {1}".format(label, value))
+                tooltip.append("{0}: {1}".format(label, snapshot[column]))
+            if self.stalled:
+                tooltip.append("Not responding")
             return "\n".join(tooltip)
 
+        elif role == Qt.ForegroundRole:
+            if self.stalled:
+                return QColor(Qt.gray)
+
     def headerData(self, section, orientation, role):
         if orientation != Qt.Horizontal:
             return None
@@ -149,14 +276,42 @@ class StorageModel(QAbstractTableModel):
 
 def main(args):
     app = QApplication (args)
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Storage View Example")
+    parser.addHelpOption()
+    intervalOption = QCommandLineOption(['i', 'interval'],
+            "Refresh the volumes every <seconds>.", 'seconds', '5')
+    parser.addOption(intervalOption)
+    timeoutOption = QCommandLineOption(['t', 'timeout'],
+            "Grey out the volumes if a refresh takes longer than <seconds>.",
+            'seconds', '2')
+    parser.addOption(timeoutOption)
+    parser.process(app)
+    try:
+        interval = int(float(parser.value(intervalOption)) * 1000)
+        timeout = int(float(parser.value(timeoutOption)) * 1000)
+    except ValueError:
+        parser.showHelp(1)
     view = QTreeView()
-    view.setModel(StorageModel(view))
+    model = StorageModel(view, interval, timeout)
+    view.setModel(model)
     view.resize(640, 480)
     view.setSelectionBehavior(QAbstractItemView.SelectRows)
-    for column in range(view.model().columnCount()):
-        view.resizeColumnToContents(column)
+
+    def resizeColumns():
+        for column in range(model.columnCount()):
+            view.resizeColumnToContents(column)
+
+    # The volumes only arrive once they have first been sampled.
+    model.modelReset.connect(resizeColumns)
+    app.aboutToQuit.connect(model.stopRefreshing)
     view.show()
-    return app.exec_()
+    status = app.exec_()
+    if StorageRefresher.detached:
+        # A thread stuck on a volume can neither be waited for nor destroyed
+        # while it runs, so leave without tearing anything down.
+        os._exit(status)
+    return status
 
 
 if __name__ == '__main__':
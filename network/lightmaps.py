@@ -45,14 +45,18 @@
 
 
 import math
+import os
+import time
+from collections import OrderedDict
+from email.utils import mktime_tz, parsedate_tz
 
 from PyQt5.QtCore import (pyqtSignal, QBasicTimer, QObject, QPoint, QPointF,
-        QRect, QSize, QStandardPaths, Qt, QUrl)
+        QRect, QRunnable, QSize, QStandardPaths, Qt, QThreadPool, QTimer,
+        QUrl)
 from PyQt5.QtGui import (QColor, QDesktopServices, QImage, QPainter,
         QPainterPath, QPixmap, QRadialGradient)
 from PyQt5.QtWidgets import QAction, QApplication, QMainWindow, QWidget
-from PyQt5.QtNetwork import (QNetworkAccessManager, QNetworkDiskCache,
-        QNetworkRequest)
+from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest
 
 
 # how long (milliseconds) the user need to hold (after a tap on the screen)
@@ -68,6 +72,41 @@ MAX_MAGNIFIER = 229
 # tile size in pixels
 TDIM = 256
 
+# where the tiles are downloaded from, formatted with the zoom, x and y
+TILE_URL = 'http://tile.openstreetmap.org/%d/%d/%d.png'
+
+# how many bytes of decoded tiles are kept in memory
+MEMORY_CACHE_BUDGET = 64 * 1024 * 1024
+
+# how many bytes of downloaded tiles are kept on disk, and how far below that
+# the cache is pruned once it is exceeded
+DISK_CACHE_BUDGET = 50 * 1024 * 1024
+DISK_CACHE_PRUNE_RATIO = 0.9
+
+# how long (seconds) a tile is kept on disk when the server doesn't say
+TILE_MAX_AGE = 7 * 24 * 60 * 60
+
+# how many tile requests are kept in flight at once
+MAX_REQUESTS = 6
+
+# how long (seconds) before a tile that failed is requested again, the delay
+# doubling each time it fails again up to the maximum
+RETRY_DELAY = 5
+RETRY_MAX_DELAY = 5 * 60
+
+# how many tiles ahead of a flick are prefetched
+PREFETCH_TILES = 8
+
+# how far ahead (seconds) a flick is extrapolated to find the tiles to
+# prefetch, and the most tiles beyond the view that can take it
+PREFETCH_LOOKAHEAD = 0.5
+PREFETCH_DEPTH = 2
+
+# how slow (pixels per second) a pan can be before tiles are prefetched, and
+# how long (seconds) between pans before it no longer counts as a flick
+PREFETCH_MIN_SPEED = 200
+PAN_IDLE_TIME = 0.25
+
 
 class Point(QPoint):
     """QPoint, that is fully qualified as a dict key"""
@@ -108,18 +147,419 @@ def latitudeFromTile(ty, zoom):
     return lng
 
 
+def tileExpiry(reply):
+    """The time a downloaded tile expires, from its HTTP headers"""
+    cacheControl = bytes(reply.rawHeader(b'Cache-Control')).decode('latin-1')
+    for directive in cacheControl.split(','):
+        name, _, value = directive.strip().partition('=')
+        if name.lower() == 'max-age' and value.isdigit():
+            return time.time() + int(value)
+
+    expires = parsedate_tz(bytes(reply.rawHeader(b'Expires')).decode('latin-1'))
+    if expires is not None:
+        return mktime_tz(expires)
+
+    return time.time() + TILE_MAX_AGE
+
+
+class TileDecoderSignals(QObject):
+
+    decoded = pyqtSignal(object, QImage, QImage)
+
+
+class TileDecoder(QRunnable):
+    """Decodes a tile in a worker thread, along with its night mode variant.
+
+    The tile is decoded from the data that was downloaded, which is then
+    saved to the disk cache, or else read from the disk cache.  Both images
+    are converted to the format that is quickest to draw.
+    """
+
+    def __init__(self, key, path, data=None, expires=None):
+        super(TileDecoder, self).__init__()
+
+        self.signals = TileDecoderSignals()
+        self._key = key
+        self._path = path
+        self._data = data
+        self._expires = expires
+
+    def run(self):
+        img = QImage()
+        if self._data is None:
+            ok = img.load(self._path + '.png')
+        else:
+            ok = img.loadFromData(self._data)
+
+        if not ok:
+            self.signals.decoded.emit(self._key, QImage(), QImage())
+            return
+
+        if self._data is None:
+            # the disk cache is pruned of the least recently used tiles first
+            try:
+                os.utime(self._path + '.png')
+            except OSError:
+                pass
+        else:
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                with open(self._path + '.png', 'wb') as f:
+                    f.write(self._data)
+                with open(self._path + '.expires', 'w') as f:
+                    f.write(repr(self._expires))
+            except OSError:
+                pass
+
+        day = img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        night = QImage(day)
+        night.invertPixels()
+        self.signals.decoded.emit(self._key, day, night)
+
+
+class DiskPrunerSignals(QObject):
+
+    pruned = pyqtSignal(object)
+
+
+class DiskPruner(QRunnable):
+    """Deletes tiles from the disk cache in a worker thread until they fit.
+
+    The expired tiles are deleted first, then the least recently used, down
+    to DISK_CACHE_PRUNE_RATIO of the budget.  The bytes the tiles then take
+    are sent with pruned.
+    """
+
+    def __init__(self, directory, budget):
+        super(DiskPruner, self).__init__()
+
+        self.signals = DiskPrunerSignals()
+        self._directory = directory
+        self._budget = budget
+
+    def run(self):
+        now = time.time()
+        tiles = []
+        for root, dirs, files in os.walk(self._directory):
+            for name in files:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name[:-4])
+                try:
+                    size = os.path.getsize(path + '.png')
+                    used = os.path.getmtime(path + '.png')
+                    with open(path + '.expires') as f:
+                        expired = float(f.read()) < now
+                except (OSError, ValueError):
+                    size, used, expired = 0, 0.0, True
+                # expired tiles go first, then the least recently used
+                tiles.append((not expired, used, size, path))
+
+        diskUsed = sum(tile[2] for tile in tiles)
+        if diskUsed > self._budget:
+            tiles.sort()
+            target = self._budget * DISK_CACHE_PRUNE_RATIO
+            for _, _, size, path in tiles:
+                if diskUsed <= target:
+                    break
+                for suffix in ('.png', '.expires'):
+                    try:
+                        os.remove(path + suffix)
+                    except OSError:
+                        pass
+                diskUsed -= size
+
+        self.signals.pruned.emit(diskUsed)
+
+
+class TileCache(QObject):
+    """Map tiles shared by the SlippyMap instances of a view.
+
+    Decoded tiles are kept in memory as a day and a night mode image, the
+    least recently used being dropped once they take more than memoryBudget
+    bytes, except for those a map has pinned as being in view.  The
+    downloaded data is kept on disk as zoom/x/y.png, next to a
+    zoom/x/y.expires file holding the time it expires.  Once they take more
+    than diskBudget bytes, the expired tiles and then the least recently
+    used are deleted.  Tiles are decoded, and the disk cache pruned, in the
+    global thread pool and tileDecoded is emitted when one is ready or has
+    failed to decode.
+    """
+
+    tileDecoded = pyqtSignal(int, int, int, bool)
+
+    def __init__(self, directory, memoryBudget=MEMORY_CACHE_BUDGET,
+                 diskBudget=DISK_CACHE_BUDGET, parent=None):
+        super(TileCache, self).__init__(parent)
+
+        self.directory = directory
+        self.memoryBudget = memoryBudget
+        self.diskBudget = diskBudget
+        self._images = OrderedDict() # (zoom, x, y) to (day, night) mapping
+        self._memoryUsed = 0
+        self._diskUsed = None # unknown until the directory is first scanned
+        self._pruning = False
+        self._savedWhilePruning = 0
+        self._decoding = set()
+        self._downloaded = {} # (zoom, x, y) to size mapping, until it's saved
+        self._pinned = {} # owner to set of (zoom, x, y) mapping
+
+    def tileCapacity(self):
+        """How many tiles fit in the memory cache"""
+        return self.memoryBudget // (TDIM * TDIM * 4 * 2)
+
+    def image(self, zoom, x, y, night=False):
+        """The tile if it is in memory, otherwise None"""
+        key = (zoom, x, y)
+        images = self._images.get(key)
+        if images is None:
+            return None
+
+        self._images.move_to_end(key)
+        return images[1] if night else images[0]
+
+    def isDecoding(self, zoom, x, y):
+        return (zoom, x, y) in self._decoding
+
+    def pin(self, owner, keys):
+        """Replace the tiles owner is showing, which are kept in memory"""
+        if keys:
+            self._pinned[owner] = set(keys)
+        else:
+            self._pinned.pop(owner, None)
+
+    def load(self, zoom, x, y):
+        """Start loading a tile that hasn't expired from disk into memory"""
+        path = self.tilePath(zoom, x, y)
+        try:
+            with open(path + '.expires') as f:
+                expires = float(f.read())
+        except (OSError, ValueError):
+            return False
+
+        if expires < time.time():
+            return False
+
+        self._decode((zoom, x, y), TileDecoder((zoom, x, y), path))
+        return True
+
+    def insert(self, zoom, x, y, data, expires):
+        """Start storing a downloaded tile on disk and in memory"""
+        self._downloaded[(zoom, x, y)] = len(data)
+        self._decode((zoom, x, y), TileDecoder((zoom, x, y),
+                self.tilePath(zoom, x, y), data, expires))
+
+    def pruneDisk(self):
+        """Start deleting tiles from disk until they fit in the budget"""
+        if self._pruning:
+            return
+
+        self._pruning = True
+        self._savedWhilePruning = 0
+        pruner = DiskPruner(self.directory, self.diskBudget)
+        pruner.signals.pruned.connect(self.handlePruned)
+        QThreadPool.globalInstance().start(pruner)
+
+    def tilePath(self, zoom, x, y):
+        return os.path.join(self.directory, str(zoom), str(x), str(y))
+
+    # slots
+    def handleDecoded(self, key, day, night):
+        self._decoding.discard(key)
+
+        # a downloaded tile has been saved by now
+        size = self._downloaded.pop(key, 0)
+        if size and not day.isNull():
+            if self._pruning:
+                self._savedWhilePruning += size
+            elif self._diskUsed is None:
+                self.pruneDisk()
+            else:
+                self._diskUsed += size
+                if self._diskUsed > self.diskBudget:
+                    self.pruneDisk()
+
+        if not day.isNull():
+            self._insert(key, (day, night))
+        self.tileDecoded.emit(key[0], key[1], key[2], not day.isNull())
+
+    def handlePruned(self, diskUsed):
+        # the tiles saved during the scan may have been counted by it too, so
+        # this errs towards pruning again early
+        self._pruning = False
+        self._diskUsed = diskUsed + self._savedWhilePruning
+        if self._diskUsed > self.diskBudget:
+            self.pruneDisk()
+
+    def _decode(self, key, decoder):
+        self._decoding.add(key)
+        decoder.signals.decoded.connect(self.handleDecoded)
+        QThreadPool.globalInstance().start(decoder)
+
+    def _insert(self, key, images):
+        old = self._images.pop(key, None)
+        if old is not None:
+            self._memoryUsed -= self._imagesBytes(old)
+
+        self._images[key] = images
+        self._memoryUsed += self._imagesBytes(images)
+
+        if self._memoryUsed <= self.memoryBudget:
+            return
+
+        pinned = set(key for keys in self._pinned.values() for key in keys)
+        pinned.add(key)
+        for oldKey in list(self._images):
+            if self._memoryUsed <= self.memoryBudget:
+                break
+            if oldKey not in pinned:
+                self._memoryUsed -= self._imagesBytes(
+                        self._images.pop(oldKey))
+
+    @staticmethod
+    def _imagesBytes(images):
+        return sum(image.byteCount() for image in images)
+
+
+class TileFetcher(QObject):
+    """Downloads the tiles wanted by one or more SlippyMap instances.
+
+    Each map gives the tiles it is missing in the order it wants them, and
+    up to maxRequests of them are kept in flight, taking the maps in turn.
+    A tile wanted by several maps is only requested once, and the requests
+    for tiles that are no longer wanted by any map are cancelled.  A tile
+    that fails to download or decode isn't requested again until a delay
+    has passed, which grows each time it fails.
+    """
+
+    tileReady = pyqtSignal(int, int, int)
+
+    def __init__(self, cache, parent=None, maxRequests=MAX_REQUESTS):
+        super(TileFetcher, self).__init__(parent)
+
+        self.maxRequests = maxRequests
+        self._cache = cache
+        self._wanted = {} # requester to list of (zoom, x, y) mapping
+        self._replies = {} # (zoom, x, y) to QNetworkReply mapping
+        self._failed = {} # (zoom, x, y) to (retry time, delay) mapping
+        self._retryTimer = QTimer(self)
+        self._retryTimer.setSingleShot(True)
+        self._retryTimer.timeout.connect(self.schedule)
+        self._manager = QNetworkAccessManager(self)
+        self._manager.finished.connect(self.handleNetworkData)
+        self._cache.tileDecoded.connect(self.handleTileDecoded)
+
+    def request(self, requester, tiles):
+        """Replace the tiles wanted by requester, most wanted first"""
+        self._wanted[requester] = tiles
+
+        wanted = set()
+        for keys in self._wanted.values():
+            wanted.update(keys)
+
+        for key in list(self._replies.keys()):
+            if key not in wanted:
+                self._replies.pop(key).abort()
+
+        self.schedule()
+
+    def schedule(self):
+        now = time.monotonic()
+        for key, (retry, delay) in list(self._failed.items()):
+            # forget the failures that are long past
+            if retry + RETRY_MAX_DELAY < now:
+                del self._failed[key]
+
+        retries = []
+        for key in self._queue():
+            if len(self._replies) >= self.maxRequests:
+                break
+
+            if key in self._replies:
+                continue
+            if key in self._failed and self._failed[key][0] > now:
+                retries.append(self._failed[key][0])
+                continue
+            if self._cache.image(*key) is not None:
+                continue
+            if self._cache.isDecoding(*key):
+                continue
+            # tiles found on disk don't need to be downloaded
+            if self._cache.load(*key):
+                continue
+
+            request = QNetworkRequest()
+            request.setUrl(QUrl(TILE_URL % key))
+            request.setRawHeader(b'User-Agent', b'Nokia (PyQt) Graphics Dojo 1.0')
+            request.setAttribute(QNetworkRequest.User, key)
+            self._replies[key] = self._manager.get(request)
+
+        # try again once the first of the wanted tiles that failed is due
+        if retries:
+            self._retryTimer.start(int((min(retries) - now) * 1000) + 1)
+        else:
+            self._retryTimer.stop()
+
+    # slots
+    def handleNetworkData(self, reply):
+        key = reply.request().attribute(QNetworkRequest.User)
+        reply.deleteLater()
+
+        # cancelled requests have already been forgotten
+        if self._replies.get(key) is not reply:
+            return
+        del self._replies[key]
+
+        zoom, x, y = key
+        if reply.error():
+            self._fail(key)
+        else:
+            self._cache.insert(zoom, x, y, bytes(reply.readAll()),
+                               tileExpiry(reply))
+
+        self.schedule()
+
+    def handleTileDecoded(self, zoom, x, y, ok):
+        if ok:
+            self._failed.pop((zoom, x, y), None)
+            self.tileReady.emit(zoom, x, y)
+        else:
+            self._fail((zoom, x, y))
+            self.schedule()
+
+    def _fail(self, key):
+        if key in self._failed:
+            delay = min(self._failed[key][1] * 2, RETRY_MAX_DELAY)
+        else:
+            delay = RETRY_DELAY
+        self._failed[key] = (time.monotonic() + delay, delay)
+
+    def _queue(self):
+        # interleave the wanted tiles of each requester by priority
+        queues = list(self._wanted.values())
+        for rank in range(max([len(q) for q in queues] + [0])):
+            for queue in queues:
+                if rank < len(queue):
+                    yield queue[rank]
+
+
 class SlippyMap(QObject):
 
     updated = pyqtSignal(QRect)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, cache=None, fetcher=None):
         super(SlippyMap, self).__init__(parent)
 
+        if cache is None:
+            cache = TileCache(os.path.join(QStandardPaths.writableLocation(
+                    QStandardPaths.CacheLocation), 'tiles'))
+        if fetcher is None:
+            fetcher = TileFetcher(cache, self)
+
         self._offset = QPoint()
         self._tilesRect = QRect()
-        self._tilePixmaps = {} # Point(x, y) to QPixmap mapping
-        self._manager = QNetworkAccessManager()
-        self._url = QUrl()
+        self._cache = cache
+        self._fetcher = fetcher
         # public vars
         self.width = 400
         self.height = 300
@@ -127,14 +567,21 @@ class SlippyMap(QObject):
         self.latitude = 59.9138204
         self.longitude = 10.7387413
 
-        self._emptyTile = QPixmap(TDIM, TDIM)
+        self.nightMode = False
+        # where in the view the most wanted tiles are, None for its center
+        self.focus = None
+        # how many tiles to prefetch ahead of a flick
+        self.prefetchBudget = PREFETCH_TILES
+
+        self._velocity = QPointF()
+        self._lastPanTime = 0.0
+
+        self._emptyTile = QImage(TDIM, TDIM, QImage.Format_ARGB32_Premultiplied)
         self._emptyTile.fill(Qt.lightGray)
+        self._emptyNightTile = QImage(self._emptyTile)
+        self._emptyNightTile.invertPixels()
 
-        cache = QNetworkDiskCache()
-        cache.setCacheDirectory(
-            QStandardPaths.writableLocation(QStandardPaths.CacheLocation))
-        self._manager.setCache(cache)
-        self._manager.finished.connect(self.handleNetworkData)
+        self._fetcher.tileReady.connect(self.handleTileReady)
 
     def invalidate(self):
         if self.width <= 0 or self.height <= 0:
@@ -149,8 +596,8 @@ class SlippyMap(QObject):
         yp = int(self.height / 2 - (ty - math.floor(ty)) * TDIM)
 
         # first tile vertical and horizontal
-        xa = (xp + TDIM - 1) / TDIM
-        ya = (yp + TDIM - 1) / TDIM
+        xa = (xp + TDIM - 1) // TDIM
+        ya = (yp + TDIM - 1) // TDIM
         xs = int(tx) - xa
         ys = int(ty) - ya
 
@@ -158,14 +605,13 @@ class SlippyMap(QObject):
         self._offset = QPoint(xp - xa * TDIM, yp - ya * TDIM)
 
         # last tile vertical and horizontal
-        xe = int(tx) + (self.width - xp - 1) / TDIM
-        ye = int(ty) + (self.height - yp - 1) / TDIM
+        xe = int(tx) + (self.width - xp - 1) // TDIM
+        ye = int(ty) + (self.height - yp - 1) // TDIM
 
         # build a rect
         self._tilesRect = QRect(xs, ys, xe - xs + 1, ye - ys + 1)
 
-        if self._url.isEmpty():
-            self.download()
+        self.download()
 
         self.updated.emit(QRect(0, 0, self.width, self.height))
 
@@ -175,9 +621,24 @@ class SlippyMap(QObject):
                 tp = Point(x + self._tilesRect.left(), y + self._tilesRect.top())
                 box = self.tileRect(tp)
                 if rect.intersects(box):
-                    p.drawPixmap(box, self._tilePixmaps.get(tp, self._emptyTile))
+                    img = self._cache.image(self.zoom, tp.x(), tp.y(),
+                                            self.nightMode)
+                    if img is None:
+                        img = self._emptyNightTile if self.nightMode else self._emptyTile
+                    p.drawImage(box, img)
    
     def pan(self, delta):
+        # track the speed of the pan, so that a flick can be prefetched
+        now = time.monotonic()
+        elapsed = now - self._lastPanTime
+        self._lastPanTime = now
+        if elapsed > PAN_IDLE_TIME:
+            self._velocity = QPointF()
+        else:
+            # events that arrive together are treated as a frame apart
+            elapsed = max(elapsed, 0.01)
+            self._velocity = (self._velocity + QPointF(delta) / elapsed) / 2
+
         dx = QPointF(delta) / float(TDIM)
         center = tileForCoordinate(self.latitude, self.longitude, self.zoom) - dx
         self.latitude = latitudeFromTile(center.y(), self.zoom)
@@ -185,43 +646,71 @@ class SlippyMap(QObject):
         self.invalidate()
 
     # slots
-    def handleNetworkData(self, reply):
-        img = QImage()
-        tp = Point(reply.request().attribute(QNetworkRequest.User))
-        url = reply.url()
-        if not reply.error():
-            if img.load(reply, None):
-                self._tilePixmaps[tp] = QPixmap.fromImage(img)
-        reply.deleteLater()
-        self.updated.emit(self.tileRect(tp))
-
-        # purge unused tiles
-        bound = self._tilesRect.adjusted(-2, -2, 2, 2)
-        for tp in list(self._tilePixmaps.keys()):
-            if not bound.contains(tp):
-                del self._tilePixmaps[tp]
-        self.download()
+    def handleTileReady(self, zoom, x, y):
+        tp = Point(x, y)
+        if zoom == self.zoom and self._tilesRect.contains(tp):
+            self.updated.emit(self.tileRect(tp))
 
     def download(self):
-        grab = None
-        for x in range(self._tilesRect.width()):
-            for y in range(self._tilesRect.height()):
-                tp = Point(self._tilesRect.topLeft() + QPoint(x, y))
-                if tp not in self._tilePixmaps:
-                    grab = QPoint(tp)
-                    break
-
-        if grab is None:
-            self._url = QUrl()
-            return
-
-        path = 'http://tile.openstreetmap.org/%d/%d/%d.png' % (self.zoom, grab.x(), grab.y())
-        self._url = QUrl(path)
-        request = QNetworkRequest()
-        request.setUrl(self._url)
-        request.setRawHeader(b'User-Agent', b'Nokia (PyQt) Graphics Dojo 1.0')
-        request.setAttribute(QNetworkRequest.User, grab)
-        self._manager.get(request)
+        # the missing tiles, nearest to the focus first
+        if self.focus is None:
+            fc = tileForCoordinate(self.latitude, self.longitude, self.zoom)
+        else:
+            fc = (QPointF(self._tilesRect.topLeft()) +
+                  QPointF(self.focus - self._offset) / float(TDIM))
+        missing = self.missingTiles(self._tilesRect, fc)
+
+        # the tiles in view mustn't be dropped to make room for another map's
+        self._cache.pin(self, [(self.zoom, x, y)
+                for x in range(self._tilesRect.left(),
+                               self._tilesRect.right() + 1)
+                for y in range(self._tilesRect.top(),
+                               self._tilesRect.bottom() + 1)])
+
+        self._fetcher.request(self, missing + self.prefetchTiles())
+
+    def prefetchTiles(self):
+        # the missing tiles where a flick is heading, within the budget and
+        # what the cache can hold along with the tiles in view
+        speed = math.hypot(self._velocity.x(), self._velocity.y())
+        if speed < PREFETCH_MIN_SPEED:
+            return []
+        if time.monotonic() - self._lastPanTime > PAN_IDLE_TIME:
+            return []
+
+        budget = min(self.prefetchBudget, self._cache.tileCapacity() -
+                     self._tilesRect.width() * self._tilesRect.height())
+        if budget <= 0:
+            return []
+
+        # panning moves the center against the direction of the drag
+        ahead = -self._velocity * PREFETCH_LOOKAHEAD / float(TDIM)
+        ahead = QPointF(max(-PREFETCH_DEPTH, min(ahead.x(), PREFETCH_DEPTH)),
+                        max(-PREFETCH_DEPTH, min(ahead.y(), PREFETCH_DEPTH)))
+        sx = int(math.copysign(math.ceil(abs(ahead.x())), ahead.x()))
+        sy = int(math.copysign(math.ceil(abs(ahead.y())), ahead.y()))
+        rect = self._tilesRect.translated(sx, sy)
+        fc = tileForCoordinate(self.latitude, self.longitude, self.zoom) + ahead
+
+        return self.missingTiles(rect, fc, self._tilesRect)[:budget]
+
+    def missingTiles(self, rect, fc, exclude=None):
+        tiles = []
+        for x in range(rect.left(), rect.right() + 1):
+            for y in range(rect.top(), rect.bottom() + 1):
+                if exclude is not None and exclude.contains(x, y):
+                    continue
+                if self._cache.image(self.zoom, x, y) is None:
+                    dx = x + 0.5 - fc.x()
+                    dy = y + 0.5 - fc.y()
+                    tiles.append((dx * dx + dy * dy, (self.zoom, x, y)))
+
+        tiles.sort()
+        return [key for _, key in tiles]
+
+    def cancelDownloads(self):
+        self._cache.pin(self, [])
+        self._fetcher.request(self, [])
 
     def tileRect(self, tp):
         t = tp - self._tilesRect.topLeft()
@@ -239,8 +728,12 @@ class LightMaps(QWidget):
         self.snapped = False
         self.zoomed = False
         self.invert = False
-        self._normalMap = SlippyMap(self)
-        self._largeMap = SlippyMap(self)
+        self._tileCache = TileCache(os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.CacheLocation),
+                'tiles'))
+        self._tileFetcher = TileFetcher(self._tileCache, self)
+        self._normalMap = SlippyMap(self, self._tileCache, self._tileFetcher)
+        self._largeMap = SlippyMap(self, self._tileCache, self._tileFetcher)
         self.pressPos = QPoint()
         self.dragPos = QPoint()
         self.tapTimer = QBasicTimer()
@@ -258,6 +751,8 @@ class LightMaps(QWidget):
     # slots
     def toggleNightMode(self):
         self.invert = not self.invert
+        self._normalMap.nightMode = self.invert
+        self._largeMap.nightMode = self.invert
         self.update()
  
     def updateMap(self, r):
@@ -266,13 +761,18 @@ class LightMaps(QWidget):
     def activateZoom(self):
         self.zoomed = True
         self.tapTimer.stop()
+        self.warmZoom(self.dragPos)
+        self.update()
+
+    def warmZoom(self, pos):
+        # fetch the zoomed in tiles under the magnifier, before it is shown
         self._largeMap.zoom = self._normalMap.zoom + 1
         self._largeMap.width = self._normalMap.width * 2
         self._largeMap.height = self._normalMap.height * 2
         self._largeMap.latitude = self._normalMap.latitude
         self._largeMap.longitude = self._normalMap.longitude
+        self._largeMap.focus = pos * 2
         self._largeMap.invalidate()
-        self.update()
  
     def resizeEvent(self, event):
         self._normalMap.width = self.width()
@@ -286,15 +786,15 @@ class LightMaps(QWidget):
         p = QPainter()
         p.begin(self)
         self._normalMap.render(p, event.rect())
-        p.setPen(Qt.black)
+        p.setPen(Qt.white if self.invert else Qt.black)
         p.drawText(self.rect(), Qt.AlignBottom | Qt.TextWordWrap,
                    "Map data CCBYSA 2009 OpenStreetMap.org contributors")
         p.end()
 
         if self.zoomed:
             dim = min(self.width(), self.height())
-            magnifierSize = min(MAX_MAGNIFIER, dim * 2 / 3)
-            radius = magnifierSize / 2
+            magnifierSize = min(MAX_MAGNIFIER, dim * 2 // 3)
+            radius = magnifierSize // 2
             ring = radius - 15
             box = QSize(magnifierSize, magnifierSize)
 
@@ -319,7 +819,7 @@ class LightMaps(QWidget):
                 mask.end()
 
             center = self.dragPos - QPoint(0, radius)
-            center += QPoint(0, radius / 2)
+            center += QPoint(0, radius // 2)
             corner = center - QPoint(radius, radius)
             xy = center * 2 - QPoint(radius, radius)
             # only set the dimension to the magnified portion
@@ -344,12 +844,6 @@ class LightMaps(QWidget):
             p.setPen(Qt.gray)
             p.drawPath(clipPath)
 
-        if self.invert:
-            p = QPainter(self)
-            p.setCompositionMode(QPainter.CompositionMode_Difference)
-            p.fillRect(event.rect(), Qt.white)
-            p.end()
-
     def timerEvent(self, event):
         if not self.zoomed:
             self.activateZoom()
@@ -364,6 +858,7 @@ class LightMaps(QWidget):
         self.pressPos = self.dragPos = event.pos()
         self.tapTimer.stop()
         self.tapTimer.start(HOLD_TIME, self)
+        self.warmZoom(self.pressPos)
 
     def mouseMoveEvent(self, event):
         if not event.buttons():
@@ -386,6 +881,7 @@ class LightMaps(QWidget):
 
                 if not self.snapped:
                     self.tapTimer.stop()
+                    self._largeMap.cancelDownloads()
 
         else:
             self.dragPos = event.pos()
@@ -473,8 +969,29 @@ if __name__ == '__main__':
 
     import sys
 
+    from PyQt5.QtCore import QCommandLineOption, QCommandLineParser
+
     app = QApplication(sys.argv)
     app.setApplicationName('LightMaps')
+
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Light Maps Example")
+    parser.addHelpOption()
+    tileUrlOption = QCommandLineOption(['u', 'tile-url'],
+            "Download the tiles from <template>, where the zoom, x and y "
+            "are substituted for the three %d.", 'template', TILE_URL)
+    parser.addOption(tileUrlOption)
+    prefetchOption = QCommandLineOption(['p', 'prefetch'],
+            "Prefetch up to <tiles> tiles ahead of a flick.", 'tiles',
+            str(PREFETCH_TILES))
+    parser.addOption(prefetchOption)
+    parser.process(app)
+    TILE_URL = parser.value(tileUrlOption)
+    try:
+        PREFETCH_TILES = max(0, int(parser.value(prefetchOption)))
+    except ValueError:
+        parser.showHelp(1)
+
     w = MapZoom()
     w.setWindowTitle("OpenStreetMap")
     w.resize(600, 450)
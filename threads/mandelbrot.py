@@ -42,6 +42,15 @@
 #############################################################################
 
 
+import math
+import multiprocessing
+import sys
+import time
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from decimal import Decimal, localcontext
+
+import numpy as np
+
 from PyQt5.QtCore import (pyqtSignal, QMutex, QMutexLocker, QPoint, QSize, Qt,
         QThread, QWaitCondition)
 from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap, qRgb
@@ -54,15 +63,342 @@ DefaultScale = 0.00403897
 
 ZoomInFactor = 0.8
 ZoomOutFactor = 1 / ZoomInFactor
+# A 2x zoom in reuses every pixel of the last frame as a quarter of the new
+# one.
+DoubleZoomInFactor = 0.5
+DoubleZoomOutFactor = 2.0
 ScrollStep = 20
 
+# The number of iterations performed between checks for a restart or abort.
+IterationChunk = 32
+EscapeLimit = 4.0
+
+# The number of rows in each band of the frame given to a worker process.
+BandHeight = 16
+
+# The shortest time, in seconds, between the partial images of a pass that
+# is rendered in bands.
+BandUpdateInterval = 0.05
+
+# How far, in pixels, a scrolled or zoomed frame may be from the samples of
+# the previous frame for them to be reused.
+ReuseTolerance = 1e-3
+
+# A pass that changes fewer than this fraction of the pixels ends the
+# progressive refinement.
+MinChangedFraction = 0.0005
+
+# Below this scale the pixel spacing is too close to the precision of a float
+# and frames are rendered as perturbations of high precision reference orbits.
+DeepZoomScale = 1e-12
+
+# A pixel whose orbit gets this much closer to 0 than the reference orbit has
+# glitched and is rebased onto a new reference.
+GlitchTolerance = 1e-3
+MaxReferenceOrbits = 16
+
+
+class EscapeTimeState(object):
+    # The orbits of an array of points.  Each pass only continues the points
+    # that haven't escaped yet, from where the previous pass stopped.
+
+    def __init__(self, c):
+        c = c.ravel()
+
+        self.counts = np.zeros(c.size, np.int32)
+        self.escaped = 0
+        self.iterations = 0
+
+        self.index = np.arange(c.size)
+        self.c = c
+        self.z = c.copy()
+
+    def iterate(self, maxIterations, isCancelled=None):
+        # Iterate the bounded points up to maxIterations and record the
+        # iteration at which any of them escape.  None is returned if
+        # isCancelled() becomes true between chunks of iterations, otherwise
+        # the number of points that escaped.
+        index = self.index
+        c = self.c
+        z = self.z
+        limit = EscapeLimit * EscapeLimit
+        escapedBefore = self.escaped
+
+        for n in range(self.iterations + 1, maxIterations + 1):
+            if index.size == 0:
+                break
+
+            if n % IterationChunk == 0 and isCancelled is not None and isCancelled():
+                self.index, self.c, self.z = index, c, z
+                self.iterations = n - 1
+                return None
+
+            z = z * z + c
+            escaped = z.real * z.real + z.imag * z.imag >= limit
+
+            if escaped.any():
+                self.counts[index[escaped]] = n
+                self.escaped += np.count_nonzero(escaped)
+                bounded = ~escaped
+                index = index[bounded]
+                c = c[bounded]
+                z = z[bounded]
+
+        self.index, self.c, self.z = index, c, z
+        self.iterations = max(self.iterations, maxIterations)
+
+        return self.escaped - escapedBefore
+
+
+def escapeTime(c, maxIterations, isCancelled=None):
+    # Return the iteration at which each point of the array c escaped, or 0
+    # for points still bounded after maxIterations, or None if cancelled.
+    state = EscapeTimeState(c)
+
+    if state.iterate(maxIterations, isCancelled) is None:
+        return None
+
+    return state.counts
+
+
+def decimalPrecision(scaleFactor):
+    # The number of significant digits needed for coordinates at a scale.
+    return max(28, int(-math.log10(scaleFactor)) + 20)
+
+
+class ReferenceOrbit(object):
+    # The orbit of a single point computed with Decimal arithmetic, kept as
+    # complex floats starting from Z0 = 0.
+
+    def __init__(self, cx, cy, precision):
+        self.cx = cx
+        self.cy = cy
+        self.precision = precision
+        self.zx = Decimal(0)
+        self.zy = Decimal(0)
+
+        self.values = np.zeros(1024, complex)
+        self.length = 1
+        self.escaped = False
+
+    def extend(self, length, isCancelled=None):
+        # Compute the orbit up to Z(length - 1), or until it escapes.  False
+        # is returned if isCancelled() becomes true.
+        limit = EscapeLimit * EscapeLimit
+        zx = self.zx
+        zy = self.zy
+
+        with localcontext() as context:
+            context.prec = self.precision
+
+            while self.length < length and not self.escaped:
+                if self.length % IterationChunk == 0 and isCancelled is not None and isCancelled():
+                    self.zx, self.zy = zx, zy
+                    return False
+
+                zx, zy = zx * zx - zy * zy + self.cx, 2 * zx * zy + self.cy
+
+                if self.length == self.values.size:
+                    self.values = np.concatenate(
+                            (self.values, np.zeros(self.values.size, complex)))
+
+                value = complex(float(zx), float(zy))
+                self.values[self.length] = value
+                self.length += 1
+
+                if value.real * value.real + value.imag * value.imag >= limit:
+                    self.escaped = True
+
+        self.zx, self.zy = zx, zy
+
+        return True
+
+
+class PerturbationGroup(object):
+    # The pixels iterated as perturbations dz of the same reference orbit.
+
+    def __init__(self, orbit, index, dc):
+        self.orbit = orbit
+        self.index = index
+        self.dc = dc
+        self.dz = dc.copy()
+        self.iterations = 0
+
+
+class PerturbationState(object):
+    # The orbits of a frame at deep zoom.  Only the reference orbits need high
+    # precision, every pixel is iterated with floats as its difference from
+    # one of them.  Pixels that glitch, because that difference is no longer
+    # small compared with the reference, are rebased onto a new reference
+    # orbit taken from one of the glitched pixels.
+
+    def __init__(self, centerX, centerY, scaleFactor, width, height):
+        self.centerX = Decimal(centerX)
+        self.centerY = Decimal(centerY)
+        self.scaleFactor = scaleFactor
+        self.precision = decimalPrecision(scaleFactor)
+
+        self.counts = np.zeros(width * height, np.int32)
+        self.escaped = 0
+
+        # The offset of each pixel from the center of the frame, in pixels.
+        self.offsetX = np.tile(np.arange(width) - width // 2, height)
+        self.offsetY = np.repeat(np.arange(height) - height // 2, width)
+
+        # Every pixel starts out waiting for a reference orbit.
+        self.groups = []
+        self.references = 0
+        self.glitched = np.arange(width * height)
+
+    def iterate(self, maxIterations, isCancelled=None):
+        escapedBefore = self.escaped
+
+        while True:
+            for group in self.groups:
+                if not self.iterateGroup(group, maxIterations, isCancelled):
+                    return None
+
+            self.groups = [group for group in self.groups if group.index.size]
+
+            if self.glitched.size == 0 or self.references >= MaxReferenceOrbits:
+                break
+
+            self.rebase()
+
+        return self.escaped - escapedBefore
+
+    def rebase(self):
+        index = self.glitched
+        self.glitched = np.empty(0, index.dtype)
+
+        # The first reference is the center of the frame.
+        if self.references:
+            pick = index[index.size // 2]
+            refX = int(self.offsetX[pick])
+            refY = int(self.offsetY[pick])
+        else:
+            refX = refY = 0
+
+        scale = Decimal(self.scaleFactor)
+
+        with localcontext() as context:
+            context.prec = self.precision
+            cx = self.centerX + refX * scale
+            cy = self.centerY + refY * scale
+
+        dc = ((self.offsetX[index] - refX) + 1j * (self.offsetY[index] - refY)) * self.scaleFactor
+        orbit = ReferenceOrbit(cx, cy, self.precision)
+        self.groups.append(PerturbationGroup(orbit, index, dc))
+        self.references += 1
+
+    def iterateGroup(self, group, maxIterations, isCancelled):
+        # The group's dz is the perturbation of z(n + 1) after n iterations,
+        # which matches the numbering used by EscapeTimeState.
+        orbit = group.orbit
+        if not orbit.extend(maxIterations + 2, isCancelled):
+            return False
+
+        values = orbit.values
+        index = group.index
+        dc = group.dc
+        dz = group.dz
+        limit = EscapeLimit * EscapeLimit
+        tolerance = GlitchTolerance * GlitchTolerance
+
+        for n in range(group.iterations, maxIterations):
+            if index.size == 0:
+                break
+
+            if n % IterationChunk == 0 and isCancelled is not None and isCancelled():
+                group.index, group.dc, group.dz = index, dc, dz
+                group.iterations = n
+                return False
+
+            if n + 2 >= orbit.length:
+                # The reference escaped before these pixels did.
+                self.glitched = np.concatenate((self.glitched, index))
+                index = index[:0]
+                break
+
+            Z = values[n + 2]
+            dz = 2 * values[n + 1] * dz + dz * dz + dc
+            z = Z + dz
+            magnitude = z.real * z.real + z.imag * z.imag
+
+            escaped = magnitude >= limit
+            glitched = magnitude < tolerance * (Z.real * Z.real + Z.imag * Z.imag)
+
+            if escaped.any():
+                self.counts[index[escaped]] = n + 1
+                self.escaped += np.count_nonzero(escaped)
+
+            if glitched.any():
+                self.glitched = np.concatenate((self.glitched,
+                        index[glitched]))
+
+            removed = escaped | glitched
+            if removed.any():
+                kept = ~removed
+                index = index[kept]
+                dc = dc[kept]
+                dz = dz[kept]
+
+        group.index, group.dc, group.dz = index, dc, dz
+        group.iterations = max(group.iterations, maxIterations)
+
+        return True
+
+
+def complexGrid(centerX, centerY, scaleFactor, width, height, top=0,
+        bottom=None):
+    if bottom is None:
+        bottom = height
+
+    x = centerX + (np.arange(width) - width // 2) * scaleFactor
+    y = centerY + (np.arange(top, bottom) - height // 2) * scaleFactor
+
+    return x[np.newaxis, :] + 1j * y[:, np.newaxis]
+
+
+def sampleOffset(center, oldCenter, oldScale, size, oldSize, step):
+    # Return the offset such that pixel i of a frame that is step times finer
+    # than the old one lies on old pixel (offset + i) / step, or None if the
+    # pixels of the two frames aren't aligned.
+    offset = ((center - oldCenter) / oldScale + oldSize // 2) * step - size // 2
+    rounded = round(offset)
+
+    if abs(offset - rounded) > ReuseTolerance * step:
+        return None
+
+    return int(rounded)
+
+
+def iterateBand(state, maxIterations):
+    # This is run in a worker process, which is given the state of a band of
+    # the frame and returns it iterated further.
+    state.iterate(maxIterations)
+
+    return state
+
+
+def imagePixels(image):
+    # Return a writable view of the pixels of a 32-bit QImage.  Calling bits()
+    # detaches the image from any copy that has already been emitted.
+    bits = image.bits()
+    bits.setsize(image.byteCount())
+    pixels = np.frombuffer(bits, np.uint32)
+
+    return pixels.reshape(image.height(),
+            image.bytesPerLine() // 4)[:, :image.width()]
+
 
 class RenderThread(QThread):
     ColormapSize = 512
 
     renderedImage = pyqtSignal(QImage, float)
+    renderFinished = pyqtSignal()
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, workerCount=1):
         super(RenderThread, self).__init__(parent)
 
         self.mutex = QMutex()
@@ -76,10 +412,24 @@ class RenderThread(QThread):
         self.restart = False
         self.abort = False
 
+        # More than one worker renders each pass as bands in a process pool.
+        self.workerCount = workerCount
+        self.executor = None
+
+        # The viewpoint and full precision iterations of the last completed
+        # frame, used to avoid recomputing pixels when scrolling or zooming.
+        self.lastFrame = None
+
         for i in range(RenderThread.ColormapSize):
             self.colormap.append(self.rgbFromWaveLength(380.0 + (i * 400.0 / RenderThread.ColormapSize)))
 
+        # The last entry is used for the points that never escaped.
+        self.palette = np.array(self.colormap + [qRgb(0, 0, 0)], np.uint32)
+
     def __del__(self):
+        self.stop()
+
+    def stop(self):
         self.mutex.lock()
         self.abort = True
         self.condition.wakeOne()
@@ -87,6 +437,10 @@ class RenderThread(QThread):
 
         self.wait()
 
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
     def render(self, centerX, centerY, scaleFactor, resultSize):
         locker = QMutexLocker(self.mutex)
 
@@ -110,55 +464,76 @@ class RenderThread(QThread):
             centerY = self.centerY
             self.mutex.unlock()
 
-            halfWidth = resultSize.width() // 2
-            halfHeight = resultSize.height() // 2
+            if self.abort:
+                return
+
+            deepZoom = scaleFactor < DeepZoomScale
+            if not deepZoom:
+                centerX = float(centerX)
+                centerY = float(centerY)
+
             image = QImage(resultSize, QImage.Format_RGB32)
 
             NumPasses = 8
             curpass = 0
+            escapedBefore = 0
+
+            if self.workerCount > 1 and self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workerCount,
+                        mp_context=multiprocessing.get_context('spawn'))
+
+            if deepZoom:
+                reused = None
+            else:
+                c = complexGrid(centerX, centerY, scaleFactor,
+                        resultSize.width(), resultSize.height())
+                reused = self.reuseLastFrame(centerX, centerY, scaleFactor,
+                        resultSize)
+
+            if reused is not None:
+                # Only the pixels that weren't in the last frame are computed,
+                # and at its final number of iterations.
+                MaxIterations, iterations, exposed = reused
+                exposedIterations = escapeTime(c[exposed], MaxIterations,
+                        self.isInterrupted)
+
+                if exposedIterations is None:
+                    if self.abort:
+                        return
+                else:
+                    iterations[exposed] = exposedIterations
+                    self.lastFrame = (centerX, centerY, scaleFactor,
+                            MaxIterations, iterations)
+                    self.colorize(image, iterations.ravel())
+                    if not self.restart:
+                        self.renderedImage.emit(image, scaleFactor)
+
+                curpass = NumPasses
+            elif deepZoom:
+                states = [PerturbationState(centerX, centerY, scaleFactor,
+                        resultSize.width(), resultSize.height())]
+            elif self.executor is None:
+                states = [EscapeTimeState(c)]
+            else:
+                states = [EscapeTimeState(c[top:top + BandHeight])
+                        for top in range(0, resultSize.height(), BandHeight)]
+
+                # The bands that haven't completed yet are shown as black.
+                image.fill(Qt.black)
 
             while curpass < NumPasses:
                 MaxIterations = (1 << (2 * curpass + 6)) + 32
-                Limit = 4
-                allBlack = True
 
-                for y in range(-halfHeight, halfHeight):
-                    if self.restart:
-                        break
+                states = self.iterateStates(states, MaxIterations,
+                        local=deepZoom, image=image, scaleFactor=scaleFactor)
+                if states is None:
                     if self.abort:
                         return
+                    break
 
-                    ay = 1j * (centerY + (y * scaleFactor))
-
-                    for x in range(-halfWidth, halfWidth):
-                        c0 = centerX + (x * scaleFactor) + ay
-                        c = c0
-                        numIterations = 0
-
-                        while numIterations < MaxIterations:
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-
-                        if numIterations < MaxIterations:
-                            image.setPixel(x + halfWidth, y + halfHeight,
-                                           self.colormap[numIterations % RenderThread.ColormapSize])
-                            allBlack = False
-                        else:
-                            image.setPixel(x + halfWidth, y + halfHeight, qRgb(0, 0, 0))
+                iterations = np.concatenate([state.counts for state in states])
+                escaped = sum(state.escaped for state in states)
+                allBlack = escaped == 0
 
                 if allBlack and curpass == 0:
                     curpass = 4
@@ -167,12 +542,150 @@ class RenderThread(QThread):
                         self.renderedImage.emit(image, scaleFactor)
                     curpass += 1
 
-            self.mutex.lock()
+                    # Stop refining once a pass hardly changes the image.
+                    changed = escaped - escapedBefore
+                    escapedBefore = escaped
+                    if not allBlack and changed < MinChangedFraction * iterations.size:
+                        curpass = NumPasses
+
+                    # Deep zoom frames aren't reused as their centers need
+                    # more precision than a float.
+                    if curpass == NumPasses and deepZoom:
+                        self.lastFrame = None
+                    elif curpass == NumPasses:
+                        self.lastFrame = (centerX, centerY, scaleFactor,
+                                MaxIterations,
+                                iterations.reshape(resultSize.height(),
+                                        resultSize.width()))
+
             if not self.restart:
+                self.renderFinished.emit()
+
+            # stop() may have been called since abort was last checked, and
+            # its wake-up would then be missed.
+            self.mutex.lock()
+            if not self.restart and not self.abort:
                 self.condition.wait(self.mutex)
             self.restart = False
+            abort = self.abort
             self.mutex.unlock()
 
+            if abort:
+                return
+
+    def isInterrupted(self):
+        return self.restart or self.abort
+
+    def reuseLastFrame(self, centerX, centerY, scaleFactor, resultSize):
+        # Return the iterations of the last frame moved to where they are in
+        # the new one, with a mask of the pixels that still need computing,
+        # or None if the new frame isn't a translation or a 2x zoom of it.
+        # Only the '*' key zooms by exactly 2x, the wheel and '+' steps don't.
+        if self.lastFrame is None:
+            return None
+
+        oldX, oldY, oldScale, maxIterations, old = self.lastFrame
+        oldHeight, oldWidth = old.shape
+
+        for step in (1, 2):
+            if abs(oldScale / scaleFactor - step) < 1e-9 * step:
+                break
+        else:
+            return None
+
+        colOffset = sampleOffset(centerX, oldX, oldScale, resultSize.width(),
+                oldWidth, step)
+        rowOffset = sampleOffset(centerY, oldY, oldScale, resultSize.height(),
+                oldHeight, step)
+        if colOffset is None or rowOffset is None:
+            return None
+
+        cols = colOffset + np.arange(resultSize.width())
+        rows = rowOffset + np.arange(resultSize.height())
+        colsKept = (cols % step == 0) & (cols >= 0) & (cols < oldWidth * step)
+        rowsKept = (rows % step == 0) & (rows >= 0) & (rows < oldHeight * step)
+        if not colsKept.any() or not rowsKept.any():
+            return None
+
+        iterations = np.zeros((resultSize.height(), resultSize.width()),
+                np.int32)
+        exposed = np.ones(iterations.shape, bool)
+        kept = np.ix_(rowsKept, colsKept)
+        iterations[kept] = old[np.ix_(rows[rowsKept] // step,
+                cols[colsKept] // step)]
+        exposed[kept] = False
+
+        return maxIterations, iterations, exposed
+
+    def iterateStates(self, states, maxIterations, local=False, image=None,
+            scaleFactor=None):
+        # The iterations are colorized into image, if given, as they are
+        # computed.
+        if self.executor is None or local:
+            for state in states:
+                if state.iterate(maxIterations, self.isInterrupted) is None:
+                    return None
+
+            if image is not None:
+                self.colorize(image,
+                        np.concatenate([state.counts for state in states]))
+
+            return states
+
+        # Bands are gathered as they complete, and the image is sent on
+        # while they do so that the bands finished first are shown early.  A
+        # new render request cancels the bands of this frame that haven't been
+        # started.
+        futures = {self.executor.submit(iterateBand, state, maxIterations): i
+                for i, state in enumerate(states)}
+        states = list(states)
+        sent = time.monotonic()
+
+        try:
+            for future in as_completed(futures):
+                if self.isInterrupted():
+                    for pending in futures:
+                        pending.cancel()
+
+                    return None
+
+                i = futures[future]
+                states[i] = future.result()
+
+                if image is not None:
+                    self.colorize(image, states[i].counts, i * BandHeight)
+                    if time.monotonic() - sent >= BandUpdateInterval:
+                        self.renderedImage.emit(image, scaleFactor)
+                        sent = time.monotonic()
+        except Exception as e:
+            # The pool is broken or a band couldn't be sent to it, so carry
+            # on without it.  The bands that did complete are kept.
+            sys.stderr.write("Rendering in worker processes failed, rendering "
+                    "in a single thread instead: %r\n" % e)
+
+            for pending in futures:
+                pending.cancel()
+
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.workerCount = 1
+
+            return self.iterateStates(states, maxIterations, image=image,
+                    scaleFactor=scaleFactor)
+
+        return states
+
+    def colorize(self, image, iterations, top=0):
+        # Colorize the rows of image from top on, as many as iterations
+        # holds.
+        index = np.where(iterations > 0,
+                iterations % RenderThread.ColormapSize,
+                RenderThread.ColormapSize)
+
+        rows = index.size // image.width()
+        imagePixels(image)[top:top + rows] = self.palette[index.reshape(rows,
+                image.width())]
+
     def rgbFromWaveLength(self, wave):
         r = 0.0
         g = 0.0
@@ -210,16 +723,18 @@ class RenderThread(QThread):
 
 
 class MandelbrotWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, workerCount=1):
         super(MandelbrotWidget, self).__init__(parent)
 
-        self.thread = RenderThread()
+        self.thread = RenderThread(workerCount=workerCount)
         self.pixmap = QPixmap()
         self.pixmapOffset = QPoint()
         self.lastDragPos = QPoint()
 
-        self.centerX = DefaultCenterX
-        self.centerY = DefaultCenterY
+        # The center is kept as a Decimal so that it can be scrolled with the
+        # precision needed at deep zoom.
+        self.centerX = Decimal(str(DefaultCenterX))
+        self.centerY = Decimal(str(DefaultCenterY))
         self.pixmapScale = DefaultScale
         self.curScale = DefaultScale
 
@@ -256,8 +771,8 @@ class MandelbrotWidget(QWidget):
             painter.drawPixmap(exposed, self.pixmap, exposed)
             painter.restore()
 
-        text = "Use mouse wheel or the '+' and '-' keys to zoom. Press and " \
-                "hold left mouse button to scroll."
+        text = "Use mouse wheel or the '+' and '-' keys to zoom, '*' and " \
+                "'/' to zoom 2x. Press and hold left mouse button to scroll."
         metrics = painter.fontMetrics()
         textWidth = metrics.width(text)
 
@@ -278,6 +793,10 @@ class MandelbrotWidget(QWidget):
             self.zoom(ZoomInFactor)
         elif event.key() == Qt.Key_Minus:
             self.zoom(ZoomOutFactor)
+        elif event.key() == Qt.Key_Asterisk:
+            self.zoom(DoubleZoomInFactor)
+        elif event.key() == Qt.Key_Slash:
+            self.zoom(DoubleZoomOutFactor)
         elif event.key() == Qt.Key_Left:
             self.scroll(-ScrollStep, 0)
         elif event.key() == Qt.Key_Right:
@@ -330,8 +849,12 @@ class MandelbrotWidget(QWidget):
                 self.size())
 
     def scroll(self, deltaX, deltaY):
-        self.centerX += deltaX * self.curScale
-        self.centerY += deltaY * self.curScale
+        with localcontext() as context:
+            context.prec = decimalPrecision(self.curScale)
+            scale = Decimal(self.curScale)
+            self.centerX += Decimal(deltaX) * scale
+            self.centerY += Decimal(deltaY) * scale
+
         self.update()
         self.thread.render(self.centerX, self.centerY, self.curScale,
                 self.size())
@@ -341,7 +864,23 @@ if __name__ == '__main__':
 
     import sys
 
+    from PyQt5.QtCore import QCommandLineOption, QCommandLineParser
+
     app = QApplication(sys.argv)
-    widget = MandelbrotWidget()
+
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Mandelbrot Example")
+    parser.addHelpOption()
+    workersOption = QCommandLineOption(['j', 'workers'],
+            "Render in tiles using <count> worker processes.", 'count', '1')
+    parser.addOption(workersOption)
+    parser.process(app)
+
+    try:
+        workerCount = max(1, int(parser.value(workersOption)))
+    except ValueError:
+        parser.showHelp(1)
+
+    widget = MandelbrotWidget(workerCount=workerCount)
     widget.show()
     sys.exit(app.exec_())
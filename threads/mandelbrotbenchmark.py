@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+# Render a fixed set of viewpoints with the Mandelbrot example's RenderThread
+# without a GUI and write the timings as JSON.
+
+
+import json
+import sys
+import time
+
+from PyQt5.QtCore import (QCommandLineOption, QCommandLineParser,
+        QCoreApplication, QEventLoop, QSize, QTimer)
+
+from mandelbrot import (DefaultCenterX, DefaultCenterY, DefaultScale,
+        RenderThread)
+
+
+# Each viewpoint is (centerX, centerY, scaleFactor, width, height).
+Viewpoints = (
+    (DefaultCenterX, DefaultCenterY, DefaultScale, 550, 400),
+    (DefaultCenterX, DefaultCenterY, DefaultScale, 1920, 1080),
+    (-0.5, 0.0, 0.005, 800, 600),
+    (-0.743643887, 0.131825904, 1.5e-6, 800, 600),
+    (-1.7490, 0.0, 2e-5, 800, 600),
+    (-0.1011, 0.9563, 1e-4, 640, 480),
+)
+
+# The longest time, in seconds, a single viewpoint is allowed to render for.
+RenderTimeout = 600
+
+
+class RenderBenchmark(object):
+    def __init__(self, workerCount=1):
+        self.thread = RenderThread(workerCount=workerCount)
+        self.thread.renderedImage.connect(self.imageRendered)
+        self.thread.renderFinished.connect(self.renderFinished)
+
+        self.loop = QEventLoop()
+        self.passTimes = []
+
+        # A single timer, restarted for each viewpoint, so that the timeout
+        # of one viewpoint can't cut short the render of a later one.
+        self.timeout = QTimer()
+        self.timeout.setSingleShot(True)
+        self.timeout.setInterval(RenderTimeout * 1000)
+        self.timeout.timeout.connect(self.loop.quit)
+
+    def run(self, viewpoints):
+        return [self.measure(*viewpoint) for viewpoint in viewpoints]
+
+    def measure(self, centerX, centerY, scaleFactor, width, height):
+        # Measure a cold render, without reusing the previous frame.
+        self.thread.lastFrame = None
+        self.passTimes = []
+        self.finished = False
+
+        self.timeout.start()
+        self.start = time.perf_counter()
+        self.thread.render(centerX, centerY, scaleFactor, QSize(width, height))
+        self.loop.exec_()
+        totalTime = time.perf_counter() - self.start
+        self.timeout.stop()
+
+        pixels = width * height
+        passes = []
+        previous = 0.0
+        for passTime in self.passTimes:
+            elapsed = passTime - previous
+            previous = passTime
+            passes.append({
+                'time': elapsed,
+                'pixelsPerSecond': pixels / elapsed if elapsed > 0 else None,
+            })
+
+        return {
+            'centerX': centerX,
+            'centerY': centerY,
+            'scaleFactor': scaleFactor,
+            'width': width,
+            'height': height,
+            'completed': self.finished,
+            'totalTime': totalTime,
+            'timeToFirstImage': self.passTimes[0] if self.passTimes else None,
+            'passes': passes,
+        }
+
+    def stop(self):
+        self.thread.stop()
+
+    def imageRendered(self, image, scaleFactor):
+        self.passTimes.append(time.perf_counter() - self.start)
+
+    def renderFinished(self):
+        self.finished = True
+        self.loop.quit()
+
+
+if __name__ == '__main__':
+
+    app = QCoreApplication(sys.argv)
+
+    parser = QCommandLineParser()
+    parser.setApplicationDescription("Qt Mandelbrot Example Benchmark")
+    parser.addHelpOption()
+    outputOption = QCommandLineOption(['o', 'output'],
+            "Write the results to <file> rather than stdout.", 'file')
+    parser.addOption(outputOption)
+    workersOption = QCommandLineOption(['j', 'workers'],
+            "Render in tiles using <count> worker processes.", 'count', '1')
+    parser.addOption(workersOption)
+    parser.process(app)
+
+    try:
+        workerCount = max(1, int(parser.value(workersOption)))
+    except ValueError:
+        parser.showHelp(1)
+
+    benchmark = RenderBenchmark(workerCount)
+    results = {
+        'workers': workerCount,
+        'viewpoints': benchmark.run(Viewpoints),
+    }
+    benchmark.stop()
+
+    if parser.isSet(outputOption):
+        with open(parser.value(outputOption), 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')